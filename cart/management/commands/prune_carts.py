@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cart.pruning import prune_carts, prune_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete carts untouched for N days and expired sessions in small batches (run from cron or with --every)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted")
+        parser.add_argument("--every", type=int, metavar="MINUTES", help="Keep running and prune every N minutes")
+
+    def handle(self, *args, **options):
+        while True:
+            self.prune(options)
+            if not options["every"]:
+                break
+            time.sleep(options["every"] * 60)
+
+    def prune(self, options):
+        prefix = "🔍 dry run: " if options["dry_run"] else "✅ "
+        carts = items = sessions = 0
+
+        for batch in prune_carts(options["days"], options["batch_size"], options["dry_run"]):
+            carts += batch.carts
+            items += batch.items
+            self.stdout.write(
+                f"carts #{batch.first}-#{batch.last}: {batch.carts} carts, {batch.items} items "
+                f"in {batch.elapsed * 1000:.0f}ms"
+            )
+            time.sleep(options["pause"])
+
+        for batch in prune_sessions(options["batch_size"], options["dry_run"]):
+            sessions += batch.sessions
+            self.stdout.write(f"sessions: {batch.sessions} in {batch.elapsed * 1000:.0f}ms")
+            time.sleep(options["pause"])
+
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{carts} carts, {items} items, {sessions} sessions removed"))
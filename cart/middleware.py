@@ -0,0 +1,18 @@
+from django.utils.cache import patch_vary_headers
+
+
+class GuestCartMiddleware:
+    """Persist the anonymous cart store when a view changed it."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        store = getattr(request, "_guest_cart", None)
+        if store is not None:
+            # خروجی به کوکی سبد بستگی داشته است
+            patch_vary_headers(response, ("Cookie",))
+            if store.modified:
+                store.save(response)
+        return response
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:35
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+
+    # سبدهای تکراری هر کاربر در قدیمی‌ترین سبد ادغام می‌شوند
+    carts = (
+        Cart.objects.filter(user__isnull=False)
+        .values('user')
+        .annotate(n=models.Count('id'), keep=models.Min('id'))
+        .filter(n__gt=1)
+    )
+    for row in carts:
+        CartItem.objects.filter(cart__user=row['user']).exclude(cart_id=row['keep']).update(cart_id=row['keep'])
+        Cart.objects.filter(user=row['user']).exclude(pk=row['keep']).delete()
+
+    # ردیف‌های تکراری یک سبد در قدیمی‌ترین ردیف جمع زده می‌شوند
+    lines = (
+        CartItem.objects
+        .values('cart', 'product', 'capacity')
+        .annotate(n=models.Count('id'), keep=models.Min('id'), total=models.Sum('quantity'))
+        .filter(n__gt=1)
+    )
+    for row in lines:
+        CartItem.objects.filter(
+            cart=row['cart'], product=row['product'], capacity=row['capacity'],
+        ).exclude(pk=row['keep']).delete()
+        CartItem.objects.filter(pk=row['keep']).update(quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_initial'),
+        ('products', '0007_comment_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='cart_unique_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(models.F('cart'), models.F('product'), django.db.models.functions.comparison.Coalesce('capacity', models.Value(0)), name='cartitem_unique_line'),
+        ),
+    ]
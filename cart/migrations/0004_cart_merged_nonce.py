@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0003_unique_cart_lines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='merged_nonce',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True),
+        ),
+    ]
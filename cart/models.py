@@ -1,7 +1,47 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connection, models
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
 
-from products.models import Product, Capacity
+from products.models import Product, Capacity, discounted_price_expression
+
+
+def _unit_price(path):
+    # معادل Capacity.final_price و Product.get_final_price در SQL
+    price = F(f'{path}__price')
+    return Case(
+        When(**{f'{path}__discount__isnull': True}, then=price),
+        default=Cast(discounted_price_expression(F(f'{path}__discount__value'), price), models.IntegerField()),
+        output_field=models.IntegerField(),
+    )
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate ``org_total``, ``final_total``, ``discount_total``,
+        ``item_count`` and ``has_physical`` with a single aggregate query.
+        """
+        has_capacity = Q(items__capacity__isnull=False)
+        quantity = F('items__quantity')
+        org_price = Case(
+            When(has_capacity, then=F('items__capacity__price')),
+            default=F('items__product__price'),
+        )
+        final_price = Case(
+            When(has_capacity, then=_unit_price('items__capacity')),
+            default=_unit_price('items__product'),
+        )
+        return self.annotate(
+            org_total=Coalesce(Sum(org_price * quantity), 0),
+            final_total=Coalesce(Sum(final_price * quantity), 0),
+            item_count=Count('items'),
+            physical_count=Count('items', filter=Q(items__product__type=Product.Type.PHYSICAL)),
+        ).annotate(
+            discount_total=F('org_total') - F('final_total'),
+            has_physical=Case(When(physical_count__gt=0, then=True), default=False, output_field=models.BooleanField()),
+        )
 
 
 class Cart(models.Model):
@@ -9,21 +49,81 @@ class Cart(models.Model):
     session_key = models.CharField(max_length=40, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # nonce آخرین سبد مهمانی که در این سبد ادغام شد؛ cart.storage.merge_into_user_cart
+    merged_nonce = models.CharField(max_length=16, null=True, blank=True, editable=False)
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # NULLها یکتا حساب نمی‌شوند؛ سبدهای مهمان قدیمی user ندارند
+            models.UniqueConstraint(fields=['user'], name='cart_unique_user'),
+        ]
+
+    def _totals(self):
+        # اگر سبد با with_totals خوانده شده باشد آیتم‌ها دوباره پیمایش نمی‌شوند
+        if hasattr(self, 'final_total'):
+            return self.org_total, self.final_total
+        org_total = final_total = 0
+        for item in self.items.all():
+            org_total += item.get_item_org_total()
+            final_total += item.item_final_price()
+        return org_total, final_total
 
     def cart_org_total(self):
-        return sum([item.get_item_org_total() for item in self.items.all()])
+        return self._totals()[0]
 
     def cart_final_price(self):
-        return sum([item.item_final_price() for item in self.items.all()])
+        return self._totals()[1]
 
     def cart_discount(self):
-        return self.cart_org_total() - self.cart_final_price()
+        org_total, final_total = self._totals()
+        return org_total - final_total
 
 
     def __str__(self):
         return f"cart: {self.id}"
 
 
+class CartItemQuerySet(models.QuerySet):
+    def add_quantity(self, cart_id, product_id, capacity_id, quantity):
+        self.add_lines(cart_id, [(product_id, capacity_id, quantity)])
+
+    def add_lines(self, cart_id, lines):
+        """
+        Insert ``(product_id, capacity_id, quantity)`` lines into the cart,
+        adding to the quantity of lines that already exist, in a single
+        statement; concurrent adds of the same item never lose updates.
+        """
+        if not lines:
+            return
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        now = self.model._meta.get_field('updated_at').get_db_prep_value(timezone.now(), connection)
+        insert = (
+            f"INSERT INTO {table} ({qn('cart_id')}, {qn('product_id')}, {qn('capacity_id')}, "
+            f"{qn('quantity')}, {qn('created_at')}, {qn('updated_at')}) VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(lines))
+        )
+        params = []
+        for product_id, capacity_id, quantity in lines:
+            params += [cart_id, product_id, capacity_id, quantity, now, now]
+        if connection.vendor == 'mysql':
+            upsert = (
+                f" ON DUPLICATE KEY UPDATE {qn('quantity')} = {qn('quantity')} + VALUES({qn('quantity')}), "
+                f"{qn('updated_at')} = VALUES({qn('updated_at')})"
+            )
+        else:
+            # هدف ON CONFLICT باید دقیقاً با عبارت ایندکس cartitem_unique_line یکی باشد
+            upsert = (
+                f" ON CONFLICT ({qn('cart_id')}, {qn('product_id')}, COALESCE({qn('capacity_id')}, 0)) "
+                f"DO UPDATE SET {qn('quantity')} = {table}.{qn('quantity')} + excluded.{qn('quantity')}, "
+                f"{qn('updated_at')} = excluded.{qn('updated_at')}"
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(insert + upsert, params)
+
+
 class CartItem(models.Model):
     cart = models.ForeignKey('Cart', on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='items')
@@ -32,6 +132,17 @@ class CartItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # capacity تهی را ۰ در نظر می‌گیریم تا ردیف‌های بدون ظرفیت هم تکراری نشوند
+            models.UniqueConstraint(
+                'cart', 'product', Coalesce('capacity', Value(0)),
+                name='cartitem_unique_line',
+            ),
+        ]
+
     def item_final_price(self):
         if self.capacity:
             return self.capacity.final_price() * self.quantity
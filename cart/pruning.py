@@ -0,0 +1,71 @@
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+DB_SESSION_ENGINES = (
+    "django.contrib.sessions.backends.db",
+    "django.contrib.sessions.backends.cached_db",
+)
+
+CartBatch = namedtuple("CartBatch", "first last carts items elapsed")
+SessionBatch = namedtuple("SessionBatch", "sessions elapsed")
+
+
+def stale_carts(days):
+    cutoff = timezone.now() - timedelta(days=days)
+    # افزودن به سبد فقط updated_at آیتم را تغییر می‌دهد
+    return Cart.objects.filter(updated_at__lt=cutoff).exclude(items__updated_at__gte=cutoff)
+
+
+def prune_carts(days, batch_size=1000, dry_run=False):
+    """
+    Delete carts (and their items) untouched for ``days``, one primary-key
+    range of ``batch_size`` per short transaction. Yields a ``CartBatch`` for
+    every range that had something to delete.
+    """
+    bounds = Cart.objects.aggregate(low=Min("pk"), high=Max("pk"))
+    if bounds["low"] is None:
+        return
+    stale = stale_carts(days)
+    for first in range(bounds["low"], bounds["high"] + 1, batch_size):
+        started = time.perf_counter()
+        in_range = stale.filter(pk__gte=first, pk__lt=first + batch_size)
+        if dry_run:
+            ids = list(in_range.values_list("pk", flat=True))
+            carts, items = len(ids), CartItem.objects.filter(cart_id__in=ids).count() if ids else 0
+        else:
+            with transaction.atomic():
+                _, deleted = in_range.delete()
+            carts, items = deleted.get(Cart._meta.label, 0), deleted.get(CartItem._meta.label, 0)
+        if carts:
+            yield CartBatch(first, first + batch_size - 1, carts, items, time.perf_counter() - started)
+
+
+def prune_sessions(batch_size=1000, dry_run=False):
+    """Delete expired database sessions in batches of ``batch_size`` keys."""
+    if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+        return
+    now = timezone.now()
+    last = ""
+    while True:
+        started = time.perf_counter()
+        keys = list(
+            Session.objects
+            .filter(expire_date__lt=now, pk__gt=last)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not keys:
+            return
+        if not dry_run:
+            Session.objects.filter(pk__in=keys).delete()
+        last = keys[-1]
+        yield SessionBatch(len(keys), time.perf_counter() - started)
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import secrets
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.module_loading import import_string
+
+from products.models import Capacity, Product
+from .models import Cart, CartItem
+
+COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+MAX_LINES = 30
+ITEM_RELATED = ("product", "product__discount", "capacity", "capacity__discount")
+
+
+class CartSummary:
+    """
+    Items of a cart plus totals, computed once per request. ``totals`` is the
+    cart read with ``Cart.objects.with_totals()``; without it (guest carts)
+    the items are summed in Python.
+    """
+
+    def __init__(self, items, totals=None):
+        self.items = items
+        if totals is not None:
+            self.count = totals.item_count
+            self.org_total = totals.org_total
+            self.final_price = totals.final_total
+            self.is_physical = totals.has_physical
+        else:
+            self.count = len(items)
+            self.org_total = sum(item.get_item_org_total() for item in items)
+            self.final_price = sum(item.item_final_price() for item in items)
+            self.is_physical = any(item.product.type == Product.Type.PHYSICAL for item in items)
+        self.discount = self.org_total - self.final_price
+
+
+class DatabaseCartStore:
+    """Cart rows of a logged-in user."""
+
+    def __init__(self, user):
+        self.user = user
+
+    def items(self):
+        return list(
+            CartItem.objects
+            .filter(cart__user=self.user)
+            .select_related(*ITEM_RELATED)
+            .order_by("created_at", "id")
+        )
+
+    def summary(self):
+        items = self.items()
+        if not items:
+            return CartSummary(items)
+        return CartSummary(items, Cart.objects.with_totals().filter(user=self.user).first())
+
+    def fingerprint(self):
+        # upsert فقط updated_at آیتم را جلو می‌برد، نه updated_at سبد
+        stats = CartItem.objects.filter(cart__user=self.user).aggregate(count=Count("id"), updated=Max("updated_at"))
+        updated = stats["updated"].timestamp() if stats["updated"] else 0
+        return f"u{self.user.pk}-{stats['count']}-{updated}"
+
+    def add(self, product_id, capacity_id, quantity):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        CartItem.objects.add_quantity(cart.pk, product_id, capacity_id, quantity)
+        return True
+
+    def remove(self, item_id):
+        deleted, _ = CartItem.objects.filter(pk=item_id, cart__user=self.user).delete()
+        return bool(deleted)
+
+    def clear(self):
+        deleted, _ = Cart.objects.filter(user=self.user).delete()
+        return bool(deleted)
+
+
+class GuestCartStore:
+    """
+    Anonymous cart kept outside the database as compact
+    ``[line_id, product_id, capacity_id, quantity]`` lines. Nothing is written
+    to the database until the visitor logs in (see ``merge_into_user_cart``).
+    Subclasses decide where the lines live; ``GuestCartMiddleware`` calls
+    ``save`` when they changed.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.modified = False
+        self.next_id, self.lines, self.nonce = 1, [], None
+        try:
+            data = self.load()
+            if data:
+                next_id, lines, *rest = data
+                self.lines = [[int(value) if value else None for value in line] for line in lines][:MAX_LINES]
+                self.next_id = int(next_id)
+                self.nonce = str(rest[0]) if rest and rest[0] else None
+        except (TypeError, ValueError):
+            # داده‌ی خراب یا قدیمی را نادیده می‌گیریم
+            self.next_id, self.lines, self.nonce = 1, [], None
+
+    def load(self):
+        raise NotImplementedError
+
+    def save(self, response):
+        raise NotImplementedError
+
+    def dump(self):
+        return [self.next_id, self.lines, self.nonce]
+
+    def summary(self):
+        return CartSummary(self.items())
+
+    def fingerprint(self):
+        digest = hashlib.sha1(json.dumps(self.lines).encode()).hexdigest()[:16]
+        return f"g{len(self.lines)}-{digest}"
+
+    def items(self):
+        if not self.lines:
+            return []
+        products = Product.objects.select_related("discount").in_bulk({line[1] for line in self.lines})
+        capacity_ids = {line[2] for line in self.lines if line[2]}
+        capacities = Capacity.objects.select_related("discount").in_bulk(capacity_ids) if capacity_ids else {}
+
+        items = []
+        for line_id, product_id, capacity_id, quantity in self.lines:
+            # محصول حذف‌شده از سبد کنار گذاشته می‌شود
+            if product_id in products:
+                items.append(CartItem(
+                    id=line_id,
+                    product=products[product_id],
+                    capacity=capacities.get(capacity_id),
+                    quantity=quantity,
+                ))
+        return items
+
+    def add(self, product_id, capacity_id, quantity):
+        for line in self.lines:
+            if line[1] == product_id and line[2] == capacity_id:
+                line[3] += quantity
+                break
+        else:
+            if len(self.lines) >= MAX_LINES:
+                return False
+            self.lines.append([self.next_id, product_id, capacity_id, quantity])
+            self.next_id += 1
+        if self.nonce is None:
+            # شناسه‌ی یکتای این سبد؛ جلوی ادغام دوباره در ورودهای هم‌زمان را می‌گیرد
+            self.nonce = secrets.token_hex(8)
+        self.modified = True
+        return True
+
+    def remove(self, item_id):
+        lines = [line for line in self.lines if line[0] != item_id]
+        if len(lines) == len(self.lines):
+            return False
+        self.lines = lines
+        self.modified = True
+        return True
+
+    def clear(self):
+        if not self.lines:
+            return False
+        self.lines, self.nonce = [], None
+        self.modified = True
+        return True
+
+    def set_cookie(self, response, name, value):
+        response.set_cookie(
+            name,
+            value,
+            max_age=COOKIE_MAX_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite="Lax",
+        )
+
+
+class CookieCartStore(GuestCartStore):
+    """Lines are kept in the browser in a signed, compressed cookie."""
+
+    cookie_name = "cart"
+    salt = "cart.storage.CookieCartStore"
+
+    def load(self):
+        value = self.request.COOKIES.get(self.cookie_name)
+        if not value:
+            return None
+        try:
+            return signing.loads(value, salt=self.salt, max_age=COOKIE_MAX_AGE)
+        except signing.BadSignature:
+            return None
+
+    def save(self, response):
+        if self.lines:
+            self.set_cookie(response, self.cookie_name, signing.dumps(self.dump(), salt=self.salt, compress=True))
+        else:
+            response.delete_cookie(self.cookie_name)
+
+
+class CacheCartStore(GuestCartStore):
+    """Lines are kept in the cache; the cookie only holds a random token."""
+
+    cookie_name = "cart_id"
+
+    def load(self):
+        self.token = self.request.COOKIES.get(self.cookie_name)
+        if not self.token:
+            return None
+        return cache.get(self.cache_key())
+
+    def cache_key(self):
+        return f"guest_cart:{self.token}"
+
+    def save(self, response):
+        if self.lines:
+            if not self.token:
+                self.token = secrets.token_urlsafe(24)
+            cache.set(self.cache_key(), self.dump(), COOKIE_MAX_AGE)
+            self.set_cookie(response, self.cookie_name, self.token)
+        else:
+            if self.token:
+                cache.delete(self.cache_key())
+            response.delete_cookie(self.cookie_name)
+
+
+def guest_cart(request):
+    if not hasattr(request, "_guest_cart"):
+        request._guest_cart = import_string(settings.CART_GUEST_STORE)(request)
+    return request._guest_cart
+
+
+def get_cart_store(request):
+    if request.user.is_authenticated:
+        return DatabaseCartStore(request.user)
+    return guest_cart(request)
+
+
+def merge_into_user_cart(user, items, nonce=None):
+    """
+    Add guest ``items`` to ``user``'s cart: one upsert for all lines inside a
+    transaction, whatever the size of either cart. A guest cart whose
+    ``nonce`` is already recorded on the user's cart is not added again.
+    """
+    if not items:
+        return
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+        # دو ورود هم‌زمان با یک کوکی پشت قفل سبد منتظر می‌مانند و دومی nonce را می‌بیند
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
+        if nonce and cart.merged_nonce == nonce:
+            return
+        CartItem.objects.add_lines(cart.pk, [(item.product_id, item.capacity_id, item.quantity) for item in items])
+        if nonce:
+            Cart.objects.filter(pk=cart.pk).update(merged_nonce=nonce)
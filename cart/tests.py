@@ -1,10 +1,24 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model, login
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 from categories.models import Category
-from products.models import Product
+from products.models import Capacity, Discount, Product
 from cart.models import Cart, CartItem
+from cart.storage import MAX_LINES, CartSummary, DatabaseCartStore, merge_into_user_cart
+from orders.checkout import place_order
+from orders.models import Order
 
 User = get_user_model()
 
@@ -43,13 +57,16 @@ class TestCartViews(TestCase):
         url = reverse("cart-add", args=[self.product.slug])
 
         response = self.client.post(url, {"quantity": 1})
-
-        session_key = self.client.session.session_key
-        cart = Cart.objects.get(session_key=session_key)
-        item = CartItem.objects.get(cart=cart, product=self.product)
+        self.client.post(url, {"quantity": 2})
 
         self.assertEqual(response.status_code, 302)
-        self.assertEqual(item.quantity, 1)
+        self.assertIn("cart", self.client.cookies)
+        self.assertFalse(Cart.objects.exists())
+
+        cart = self.client.get(reverse("cart")).context["cart"]
+        self.assertEqual(cart.count, 1)
+        self.assertEqual(cart.items[0].quantity, 3)
+        self.assertEqual(cart.final_price, 600000)
 
     def test_cart_detail_authenticated(self):
         self.client.login(username="user1", password="pass12345")
@@ -74,3 +91,324 @@ class TestCartViews(TestCase):
 
         self.assertEqual(response.status_code, 302)
         self.assertFalse(CartItem.objects.filter(id=item.id).exists())
+
+
+class TestMiniCart(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name="category1", slug="category1", image="category1.jpg")
+        self.product = Product.objects.create(
+            title="Test Product",
+            slug="test-product",
+            price=200000,
+            image="product.jpg",
+            category=self.category,
+        )
+
+    def test_anonymous_view_writes_nothing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("home"))
+            self.client.get(reverse("about"))
+            self.client.get(reverse("cart"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(Session.objects.exists())
+        self.assertFalse([q for q in queries if q["sql"].startswith(("INSERT", "UPDATE"))])
+
+    def test_guest_mini_cart(self):
+        self.client.post(reverse("cart-add", args=[self.product.slug]), {"quantity": 3})
+        response = self.client.get(reverse("cart-mini"))
+        mini_cart = response.context["cart"]
+        self.assertEqual(mini_cart.count, 1)
+        self.assertEqual(mini_cart.final_price, 600000)
+        self.assertContains(response, self.product.title)
+        self.assertContains(response, 'data-cart-count="1"')
+
+    def test_page_html_does_not_depend_on_cart(self):
+        empty = self.client.get(reverse("home")).content
+        self.client.post(reverse("cart-add", args=[self.product.slug]), {"quantity": 3}, follow=True)
+        self.assertEqual(self.client.get(reverse("home")).content, empty)
+
+    def test_mini_cart_etag(self):
+        url = reverse("cart-mini")
+        first = self.client.get(url)
+        self.assertIn("private", first["Cache-Control"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+        self.client.post(reverse("cart-add", args=[self.product.slug]), {"quantity": 1})
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.client.post(reverse("cart-add", args=[self.product.slug]), {"quantity": 1})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=second["ETag"]).status_code, 200)
+
+    def test_capacity_price_change_refreshes_mini_cart(self):
+        capacity = Capacity.objects.create(capacity="1TB", platform="PS5", price=300000)
+        self.product.capacity.add(capacity)
+        url = reverse("cart-mini")
+        self.client.post(reverse("cart-add", args=[self.product.slug]), {"quantity": 1, "capacity": capacity.pk})
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        capacity.price = 350000
+        capacity.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cart"].final_price, 350000)
+
+    def test_user_mini_cart_etag(self):
+        user = User.objects.create_user(phone="user1", password="pass12345")
+        self.client.force_login(user)
+        url = reverse("cart-mini")
+        etag = self.client.get(url)["ETag"]
+
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.add_quantity(cart.pk, self.product.pk, None, 1)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=changed["ETag"]).status_code, 304)
+
+        CartItem.objects.add_quantity(cart.pk, self.product.pk, None, 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=changed["ETag"]).status_code, 200)
+
+
+class TestGuestCartStore(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(phone="user1", password="pass12345")
+        self.category = Category.objects.create(name="category1", slug="category1", image="category1.jpg")
+        self.product = Product.objects.create(
+            title="Test Product",
+            slug="test-product",
+            price=200000,
+            image="product.jpg",
+            category=self.category,
+        )
+        self.capacity = Capacity.objects.create(capacity="1TB", platform="PS5", price=50000)
+
+    def add(self, quantity=1, capacity=""):
+        return self.client.post(reverse("cart-add", args=[self.product.slug]), {"quantity": quantity, "capacity": capacity})
+
+    def cart(self):
+        return self.client.get(reverse("cart")).context["cart"]
+
+    def login(self):
+        request = RequestFactory().get("/")
+        request.COOKIES.update({name: morsel.value for name, morsel in self.client.cookies.items()})
+        SessionMiddleware(lambda r: None).process_request(request)
+        login(request, self.user, backend="django.contrib.auth.backends.ModelBackend")
+        return request
+
+    def test_remove_and_clear(self):
+        self.add()
+        self.add(capacity=self.capacity.pk)
+        items = self.cart().items
+        self.assertEqual(len(items), 2)
+
+        self.client.get(reverse("cart-remove", args=[items[0].id]))
+        self.assertEqual([item.capacity for item in self.cart().items], [self.capacity])
+        self.assertEqual(self.client.get(reverse("cart-remove", args=[items[0].id])).status_code, 404)
+
+        self.client.get(reverse("cart-delete"))
+        self.assertEqual(self.cart().count, 0)
+        self.assertEqual(self.client.get(reverse("cart-delete")).status_code, 404)
+
+    def test_tampered_cookie_is_ignored(self):
+        self.add()
+        self.client.cookies["cart"] = self.client.cookies["cart"].value + "x"
+        self.assertEqual(self.cart().count, 0)
+
+    def test_line_limit(self):
+        capacities = Capacity.objects.bulk_create(
+            Capacity(capacity=f"{i}GB", platform="PC", price=1000, sale_price=1000) for i in range(MAX_LINES)
+        )
+        for capacity in capacities:
+            self.add(capacity=capacity.pk)
+        self.add()
+        self.assertEqual(self.cart().count, MAX_LINES)
+
+    def test_login_merges_into_user_cart(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        self.add(quantity=3)
+        self.add(capacity=self.capacity.pk)
+
+        request = self.login()
+
+        items = {item.capacity_id: item.quantity for item in CartItem.objects.filter(cart__user=self.user)}
+        self.assertEqual(items, {None: 5, self.capacity.pk: 1})
+        self.assertEqual(request._guest_cart.lines, [])
+        self.assertTrue(request._guest_cart.modified)
+
+    def test_same_cookie_merges_once(self):
+        self.add(quantity=3)
+        self.login()
+        # نشانه‌ی ادغام در دیتابیس است، نه در کش هر پروسه
+        cache.clear()
+        self.login()
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 3)
+        self.assertIsNotNone(Cart.objects.get(user=self.user).merged_nonce)
+
+    def test_new_guest_cart_merges_again(self):
+        self.add(quantity=3)
+        self.login()
+        self.client.cookies.clear()
+        self.add(quantity=2)
+        self.login()
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 5)
+
+    def test_merge_query_count_is_constant(self):
+        capacities = Capacity.objects.bulk_create(
+            Capacity(capacity=f"{i}GB", platform="PC", price=1000, sale_price=1000) for i in range(MAX_LINES)
+        )
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, capacity=capacities[0], quantity=1)
+
+        counts = []
+        for size in (1, MAX_LINES):
+            items = [CartItem(product=self.product, capacity=capacity, quantity=2) for capacity in capacities[:size]]
+            with CaptureQueriesContext(connection) as queries:
+                merge_into_user_cart(self.user, items)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), MAX_LINES)
+        self.assertEqual(CartItem.objects.get(capacity=capacities[0]).quantity, 5)
+
+    @override_settings(CART_GUEST_STORE="cart.storage.CacheCartStore")
+    def test_cache_store(self):
+        self.add(quantity=2)
+        self.assertNotIn("cart", self.client.cookies)
+        self.assertEqual(self.cart().items[0].quantity, 2)
+        self.assertFalse(Cart.objects.exists())
+
+        self.login()
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 2)
+
+
+class TestCartTotals(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(phone="user1", password="pass12345")
+        category = Category.objects.create(name="category1", slug="category1", image="category1.jpg")
+        discount = Discount.objects.create(value=15)
+        account = Product.objects.create(
+            title="Account", slug="account", price=199999, image="a.jpg", category=category, discount=discount,
+        )
+        physical = Product.objects.create(
+            title="Console", slug="console", price=300000, image="c.jpg", category=category, type=Product.Type.PHYSICAL,
+        )
+        capacity = Capacity.objects.create(capacity="1TB", platform="PS5", price=77777, discount=discount)
+        plain_capacity = Capacity.objects.create(capacity="2TB", platform="PS5", price=90000)
+
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=account, quantity=3)
+        CartItem.objects.create(cart=self.cart, product=account, capacity=capacity, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=physical, capacity=plain_capacity, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=physical, quantity=1)
+
+    def test_with_totals_matches_python(self):
+        with self.assertNumQueries(1):
+            cart = Cart.objects.with_totals().get(pk=self.cart.pk)
+            self.assertEqual(cart.cart_final_price(), cart.final_total)
+
+        self.assertEqual(cart.org_total, self.cart.cart_org_total())
+        self.assertEqual(cart.final_total, self.cart.cart_final_price())
+        self.assertEqual(cart.discount_total, self.cart.cart_discount())
+        self.assertEqual(cart.item_count, 4)
+        self.assertTrue(cart.has_physical)
+
+    def test_summary_uses_sql_totals(self):
+        store = DatabaseCartStore(self.user)
+        python = CartSummary(store.items())
+        with self.assertNumQueries(2):
+            summary = store.summary()
+        self.assertEqual(
+            (summary.count, summary.org_total, summary.final_price, summary.discount, summary.is_physical),
+            (python.count, python.org_total, python.final_price, python.discount, python.is_physical),
+        )
+
+    def test_order_totals_match_cart(self):
+        cart = Cart.objects.with_totals().get(pk=self.cart.pk)
+        order, _ = place_order(self.user, Order(full_name="Test"))
+        self.assertEqual(
+            (order.org_price, order.final_price, order.total_discount),
+            (cart.org_total, cart.final_total, cart.discount_total),
+        )
+        self.assertEqual(order.final_price, sum(item.final_price for item in order.items.all()))
+
+    def test_empty_cart(self):
+        cart = Cart.objects.with_totals().get(pk=Cart.objects.create().pk)
+        self.assertEqual((cart.org_total, cart.final_total, cart.item_count, cart.has_physical), (0, 0, 0, False))
+
+
+class TestCartItemUpsert(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(phone="user1", password="pass12345")
+        category = Category.objects.create(name="category1", slug="category1", image="category1.jpg")
+        self.product = Product.objects.create(
+            title="Test Product", slug="test-product", price=1000, image="p.jpg", category=category,
+        )
+        self.cart = Cart.objects.create(user=self.user)
+
+    def test_single_statement(self):
+        with self.assertNumQueries(1):
+            CartItem.objects.add_quantity(self.cart.pk, self.product.pk, None, 2)
+        CartItem.objects.add_quantity(self.cart.pk, self.product.pk, None, 3)
+        self.assertEqual(CartItem.objects.get().quantity, 5)
+
+    def test_null_capacity_is_unique(self):
+        CartItem.objects.create(cart=self.cart, product=self.product)
+        with self.assertRaises(IntegrityError):
+            CartItem.objects.create(cart=self.cart, product=self.product)
+
+    def test_concurrent_adds_are_not_lost(self):
+        def add(_):
+            try:
+                for _ in range(10):
+                    CartItem.objects.add_quantity(self.cart.pk, self.product.pk, None, 1)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(add, range(8)))
+
+        self.assertEqual(CartItem.objects.get().quantity, 80)
+
+
+class TestPruneCarts(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name="category1", slug="category1", image="category1.jpg")
+        self.product = Product.objects.create(
+            title="Test Product", slug="test-product", price=1000, image="p.jpg", category=category,
+        )
+        old = timezone.now() - timedelta(days=40)
+        self.stale = [Cart.objects.create(session_key=f"s{i}") for i in range(3)]
+        self.fresh = Cart.objects.create(session_key="fresh")
+        self.touched = Cart.objects.create(session_key="touched")
+        for cart in self.stale + [self.touched]:
+            CartItem.objects.create(cart=cart, product=self.product)
+        Cart.objects.exclude(pk=self.fresh.pk).update(updated_at=old)
+        CartItem.objects.exclude(cart=self.touched).update(updated_at=old)
+
+        Session.objects.create(session_key="expired", session_data="", expire_date=old)
+        Session.objects.create(session_key="alive", session_data="", expire_date=timezone.now() + timedelta(days=1))
+
+    def prune(self, *args):
+        out = StringIO()
+        call_command("prune_carts", "--batch-size=2", "--pause=0", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run(self):
+        output = self.prune("--dry-run")
+        self.assertIn("3 carts, 3 items, 1 sessions", output)
+        self.assertEqual(Cart.objects.count(), 5)
+        self.assertEqual(Session.objects.count(), 2)
+
+    def test_prune(self):
+        output = self.prune()
+        self.assertEqual(output.count("carts #"), 2)
+        self.assertEqual(set(Cart.objects.all()), {self.fresh, self.touched})
+        self.assertEqual(CartItem.objects.count(), 1)
+        self.assertEqual(list(Session.objects.values_list("pk", flat=True)), ["alive"])
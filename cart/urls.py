@@ -7,4 +7,5 @@ urlpatterns = [
     path('', views.cart_detail, name='cart'),
     path('remove/<int:item_id>', views.item_remove, name='cart-remove'),
     path('delete/', views.cart_delete, name='cart-delete'),
+    path('mini/', views.mini_cart, name='cart-mini'),
 ]
@@ -1,10 +1,15 @@
-from django.contrib.auth.decorators import login_required
-from django.db.models import Prefetch
+import uuid
+
+from django.core.cache import cache
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
+from django.http import Http404
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 
 from cart.forms import AddToCartForm
-from cart.models import Cart, CartItem
+from cart.storage import get_cart_store
+from products import home
 from products.models import Product
 
 
@@ -13,74 +18,44 @@ def add_to_cart(request, product_slug):
     product = get_object_or_404(Product, slug=product_slug)
 
     if form.is_valid():
-        if request.user.is_authenticated:
-            cart, _ = Cart.objects.get_or_create(user=request.user)
-        else:
-            if not request.session.session_key:
-                request.session.create()
-            cart, _ = Cart.objects.get_or_create(session_key=request.session.session_key)
-
         capacity = form.cleaned_data.get('capacity') or None
 
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            capacity_id=capacity
-        )
-
-        if created:
-            cart_item.quantity = form.cleaned_data['quantity']
+        if get_cart_store(request).add(product.pk, capacity, form.cleaned_data['quantity']):
+            messages.success(request, 'محصول با موفقیت به سبد خرید اضافه شد.')
         else:
-            cart_item.quantity += form.cleaned_data['quantity']
-
-        cart_item.save()
-
-        messages.success(request, 'محصول با موفقیت به سبد خرید اضافه شد.')
+            messages.error(request, 'سبد خرید پر است.')
 
     return redirect("cart")
 
 def cart_detail(request):
-    if request.user.is_authenticated:
-        cart, _ = (Cart.objects.prefetch_related(Prefetch('items', queryset=CartItem.objects.prefetch_related("capacity").select_related("product").all()))
-                   .select_related("user").defer("created_at", "updated_at")
-                   .get_or_create(user=request.user))
-    else:
-        if not request.session.session_key:
-            request.session.create()
-
-        cart, _ = Cart.objects\
-            .prefetch_related(Prefetch('items', queryset=CartItem.objects.prefetch_related("capacity").select_related("product", "product__discount").defer("created_at", "updated_at")))\
-            .get_or_create(session_key=request.session.session_key)
-
-    is_physical = False
-    items = cart.items.all()
-    for item in items:
-        if item.product.type == Product.Type.PHYSICAL:
-            is_physical = True
-            break
-
-
-
-    return render(request, 'cart/cart-detail.html', {'cart': cart, 'is_physical': is_physical})
+    # سبد مهمان در کوکی است و تا زمان ورود چیزی در دیتابیس ساخته نمی‌شود
+    cart = get_cart_store(request).summary()
+    return render(request, 'cart/cart-detail.html', {
+        'cart': cart,
+        'is_physical': cart.is_physical,
+        # هر بار نمایش فرم یک کلید تازه؛ ارسال دوباره‌ی همان فرم سفارش دوم نمی‌سازد
+        'idempotency_key': uuid.uuid4().hex,
+    })
+
+def _mini_cart_etag(request):
+    # تغییر قیمت و تخفیف محصولات و ظرفیت‌ها نسخه‌ی products صفحه‌ی اصلی را عوض می‌کند
+    prices = cache.get(home.version_key("products"), 0)
+    return f"{get_cart_store(request).fingerprint()}-{prices}"
+
+@condition(etag_func=_mini_cart_etag)
+def mini_cart(request):
+    """Header badge and dropdown fragment; revalidated by the browser with If-None-Match."""
+    cart = get_cart_store(request).summary()
+    response = render(request, 'cart/_mini_cart.html', {'cart': cart})
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 def item_remove(request, item_id):
-    if request.user.is_authenticated:
-        cart = get_object_or_404(Cart, user=request.user)
-    else:
-        if not request.session.session_key:
-            request.session.create()
-        cart = get_object_or_404(Cart, session_key=request.session.session_key)
-    item = get_object_or_404(CartItem, id=item_id, cart=cart)
-    item.delete()
+    if not get_cart_store(request).remove(item_id):
+        raise Http404
     return redirect('cart')
 
 def cart_delete(request):
-    if request.user.is_authenticated:
-        cart = get_object_or_404(Cart, user=request.user)
-    else:
-        if not request.session.session_key:
-            request.session.create()
-        cart = get_object_or_404(Cart, session_key=request.session.session_key)
-
-    cart.delete()
-    return redirect('cart')
\ No newline at end of file
+    if not get_cart_store(request).clear():
+        raise Http404
+    return redirect('cart')
@@ -44,6 +44,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'cart.middleware.GuestCartMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
 ]
@@ -64,7 +65,6 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
 
                 'core.context_processors.site_settings',
-                'cart.context_processors.cart_processor',
             ],
         },
     },
@@ -94,6 +94,38 @@ STATICFILES_DIRS = [BASE_DIR.joinpath('static')]
 STATIC_ROOT = BASE_DIR.joinpath('staticfiles')
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR.joinpath('media')
+# نام فایل‌ها هش محتواست؛ آپلود تکراری همان فایل قبلی را برمی‌گرداند
+STORAGES = {
+    "default": {"BACKEND": "core.images.ContentHashedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+# تعداد پروسه‌های ساخت نسخه‌های WebP/JPEG تصاویر
+IMAGE_VARIANT_WORKERS = env.int("IMAGE_VARIANT_WORKERS", default=2)
+
+# سبد مهمان: cart.storage.CookieCartStore یا cart.storage.CacheCartStore
+CART_GUEST_STORE = env("CART_GUEST_STORE", default="cart.storage.CookieCartStore")
+
+# مهلت پرداخت سفارش پیش از آزاد شدن موجودی رزروشده (دقیقه)
+STOCK_RESERVATION_MINUTES = env.int("STOCK_RESERVATION_MINUTES", default=15)
+
+# محدودیت نرخ و آمار کش فقط با کش مشترک بین workerها (Memcached/Redis) دقیق است
+CACHES = {
+    "default": {
+        "BACKEND": env("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": env("CACHE_LOCATION", default=""),
+    }
+}
+
+# ذخیره‌ی کد ورود: core.otp.DatabaseOTPStore یا core.otp.CacheOTPStore
+# CacheOTPStore فقط وقتی CACHE_BACKEND بین workerها مشترک است (Memcached/Redis)؛ با LocMem کد در worker دیگر دیده نمی‌شود
+OTP_STORE = env("OTP_STORE", default="core.otp.DatabaseOTPStore")
+
+# ارسال پیامک: core.sms.MelipayamakProvider یا core.sms.LocalProvider (بدون شبکه)
+SMS_PROVIDER = env("SMS_PROVIDER", default="core.sms.MelipayamakProvider")
+SMS_WORKER_THREADS = env.int("SMS_WORKER_THREADS", default=4)
+MELIPAYAMAK_USERNAME = env("MELIPAYAMAK_USERNAME", default="")
+MELIPAYAMAK_APIKEY = env("MELIPAYAMAK_APIKEY", default="")
+MELIPAYAMAK_NUMBER = env("MELIPAYAMAK_NUMBER", default="")
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -101,5 +133,8 @@ AUTH_USER_MODEL = 'core.CustomUser'
 
 LOGIN_URL = "login"
 
+# صفحه‌بندی keyset برای لیست محصولات (با ?cursor= هم فعال می‌شود)
+PRODUCTS_CURSOR_PAGINATION = env.bool("PRODUCTS_CURSOR_PAGINATION", default=False)
+
 TELEGRAM_BOT_TOKEN = env("BOT_TOKEN")
 TELEGRAM_ADMIN_ID = env("USER_ID")
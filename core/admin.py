@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from core.models import SliderBanners, SideBanners, MiddleBanners, SiteSettings, CustomUser, OTP
+from core.models import Banner, SiteSettings, CustomUser, OTP, SmsMessage
 from products.models import Comment
 
 class UserCommentsInline(admin.TabularInline):
@@ -38,17 +38,34 @@ class OTPAdmin(admin.ModelAdmin):
     ]
 
 
+@admin.register(SmsMessage)
+class SmsMessageAdmin(admin.ModelAdmin):
+    list_display = ["phone", "status", "attempts", "created_at", "sent_at"]
+    list_filter = ["status"]
+    search_fields = ["phone"]
+    ordering = ["-created_at"]
+    readonly_fields = ["attempts", "last_error", "sent_at"]
+
+
 @admin.register(Comment)
 class CommentsAdmin(admin.ModelAdmin):
     list_display = ["user", "status"]
     list_display_links = ["user", "status"]
+    list_select_related = ["user"]
     search_fields = ["user", "status"]
     ordering = ['-created_at']
     list_filter = [
         "status",
     ]
 
-admin.site.register(SliderBanners)
-admin.site.register(SideBanners)
-admin.site.register(MiddleBanners)
+
+
+@admin.register(Banner)
+class BannerAdmin(admin.ModelAdmin):
+    list_display = ["link", "placement", "position", "is_active", "starts_at", "ends_at"]
+    list_display_links = ["link"]
+    # ترتیب و فعال بودن مستقیم از همین فهرست ویرایش می‌شود
+    list_editable = ["position", "is_active"]
+    list_filter = ["placement", "is_active"]
+    ordering = ["placement", "position", "id"]
 admin.site.register(SiteSettings)
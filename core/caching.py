@@ -0,0 +1,182 @@
+import math
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+LOCK_TIMEOUT = 10
+STATS_KEY = "cache_stats:{}"
+STATS_FLUSH_EVERY = 100
+# هر worker گانیکورن LocMem جدای خودش را دارد و نسخه‌ای که یک worker جلو می‌برد به بقیه نمی‌رسد
+LOCAL_VERSION_TIMEOUT = 300
+
+
+def process_local():
+    return isinstance(caches["default"], LocMemCache)
+
+
+def version_timeout(timeout=None):
+    """
+    Lifetime of a version stamp: ``timeout`` on a shared cache, at most
+    ``LOCAL_VERSION_TIMEOUT`` on a per-process cache, where a bump from one
+    worker never reaches the others and only expiry bounds their staleness.
+    """
+    if process_local():
+        return LOCAL_VERSION_TIMEOUT if timeout is None else min(timeout, LOCAL_VERSION_TIMEOUT)
+    return timeout
+
+
+class CacheStats:
+    """
+    Per-process hit/miss/stale/refresh counters, pushed to the shared cache
+    every ``STATS_FLUSH_EVERY`` events so all workers add up in one place.
+    """
+
+    EVENTS = ("hit", "miss", "stale", "refresh")
+
+    def __init__(self):
+        self.local = Counter()
+        self.pending = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, event):
+        with self.lock:
+            self.local[event] += 1
+            self.pending[event] += 1
+            flush = sum(self.pending.values()) >= STATS_FLUSH_EVERY
+        if flush:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        for event, count in pending.items():
+            key = STATS_KEY.format(event)
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                cache.set(key, count, None)
+
+    def shared(self):
+        self.flush()
+        values = cache.get_many([STATS_KEY.format(event) for event in self.EVENTS])
+        return {event: values.get(STATS_KEY.format(event), 0) for event in self.EVENTS}
+
+
+stats = CacheStats()
+
+
+@contextmanager
+def single_flight(key, timeout=LOCK_TIMEOUT):
+    """Yields True for the one caller that holds ``key``'s lock, False for the rest."""
+    lock_key = f"{key}:lock"
+    acquired = cache.add(lock_key, 1, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(lock_key)
+
+
+def cached_value(key, build, timeout, stale_timeout=None, beta=1.0, wait=2.0):
+    """
+    ``cache.get_or_set`` without the stampede when a popular key expires.
+
+    The value is kept ``stale_timeout`` (default: ``timeout``) past its soft
+    expiry. Once stale, or a little early with a probability that grows near
+    expiry (scaled by ``beta`` and the last build time), one caller takes a
+    short lock and rebuilds while everyone else keeps getting the stale value.
+    A cold miss without a stale copy waits up to ``wait`` seconds for the
+    lock holder before building itself.
+    """
+    if stale_timeout is None:
+        stale_timeout = timeout
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, refresh_at, cost = entry
+        early = cost * beta * -math.log(random.random() or 1e-12)
+        if time.time() + early < refresh_at:
+            stats.record("hit")
+            return value
+        with single_flight(key) as leader:
+            if not leader:
+                stats.record("stale")
+                return value
+            stats.record("refresh")
+            return _build(key, build, timeout, stale_timeout)
+
+    deadline = time.monotonic() + wait
+    while True:
+        with single_flight(key) as leader:
+            if leader:
+                stats.record("miss")
+                return _build(key, build, timeout, stale_timeout)
+        if time.monotonic() >= deadline:
+            stats.record("miss")
+            return build()
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            stats.record("hit")
+            return entry[0]
+
+
+def _build(key, build, timeout, stale_timeout):
+    started = time.time()
+    value = build()
+    finished = time.time()
+    cache.set(key, (value, finished + timeout, finished - started), timeout + stale_timeout)
+    return value
+
+
+class TieredCache:
+    """
+    Small, near-static values kept evaluated in a per-process dict (L1) in
+    front of the shared cache (L2). Every value of the namespace is checked
+    against one version stamp in L2, so a read costs a single ``cache.get``
+    while nothing changed. ``bump`` (from save signals) moves the stamp; each
+    worker then rebuilds on its next read, through ``cached_value`` under a
+    versioned key so only one of them hits the database.
+    """
+
+    def __init__(self, namespace, timeout=3600):
+        self.namespace = namespace
+        self.version_key = f"{namespace}:version"
+        self.timeout = timeout
+        # (version, {name: value})؛ با یک انتساب جایگزین می‌شود و قفل لازم ندارد
+        self.local = (None, {})
+
+    def version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = time.time_ns()
+            if not cache.add(self.version_key, version, version_timeout()):
+                version = cache.get(self.version_key, version)
+        return version
+
+    def bump(self):
+        cache.set(self.version_key, time.time_ns(), version_timeout())
+
+    def get_many(self, builders):
+        """``{name: build}`` -> ``{name: value}``; builders must return immutable values."""
+        version = self.version()
+        local_version, values = self.local
+        if local_version != version:
+            values = {}
+        missing = [name for name in builders if name not in values]
+        if missing:
+            values = dict(values)
+            for name in missing:
+                key = f"{self.namespace}:{name}:{version}"
+                values[name] = cached_value(key, builders[name], self.timeout)
+            self.local = (version, values)
+        return {name: values[name] for name in builders}
+
+    def clear_local(self):
+        self.local = (None, {})
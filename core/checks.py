@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+
+
+@register()
+def otp_store_cache(app_configs, **kwargs):
+    if settings.OTP_STORE == "core.otp.CacheOTPStore" and isinstance(caches["default"], LocMemCache):
+        return [Warning(
+            "CacheOTPStore keeps codes in a per-process LocMem cache; a code issued by one worker "
+            "cannot be verified by another.",
+            hint="Set CACHE_BACKEND to a shared cache (Memcached/Redis) or use core.otp.DatabaseOTPStore.",
+            id="core.W001",
+        )]
+    return []
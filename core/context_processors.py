@@ -1,18 +1,28 @@
+from collections import namedtuple
+
+from .caching import TieredCache
 from .models import SiteSettings
 
 from categories.models import Category
-from django.core.cache import cache
 
-def site_settings(request):
-    categories = cache.get('categories')
-    site_settings = cache.get('site_settings')
+MenuCategory = namedtuple("MenuCategory", "id name slug")
+# مقدار تغییرناپذیر و قابل pickle برای هر دو لایه
+SiteSettingsData = namedtuple("SiteSettingsData", [field.attname for field in SiteSettings._meta.concrete_fields])
+
+# کش دو لایه: نسخه‌ی ارزیابی‌شده در حافظه‌ی هر worker، معتبرشده با نسخه‌ی کش مشترک
+SITE_DATA = TieredCache("site_data")
+
 
-    if site_settings is None:
-        site_settings = SiteSettings.objects.first()
-        cache.set('site_settings', site_settings, 3600)
+def _site_settings():
+    instance = SiteSettings.objects.first()
+    if instance is None:
+        return None
+    return SiteSettingsData(*(getattr(instance, field) for field in SiteSettingsData._fields))
 
-    if categories is None:
-        categories = Category.objects.all()
-        cache.set('categories', categories, 3600)
 
-    return {"site_settings": site_settings, "categories": categories}
\ No newline at end of file
+def _categories():
+    return tuple(MenuCategory(*row) for row in Category.objects.values_list("id", "name", "slug"))
+
+
+def site_settings(request):
+    return SITE_DATA.get_many({"site_settings": _site_settings, "categories": _categories})
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = "derived"
+DIGEST_LENGTH = 20
+# نامی که upload_to می‌دهد؛ ContentHashedStorage آن را با هش محتوا جایگزین می‌کند
+PENDING_NAME = "content-hash"
+
+# بزرگ‌ترین ابعاد هر نسخه؛ تصویر کوچک‌تر بزرگ نمی‌شود
+VARIANTS = {
+    "thumb": (200, 200),
+    "card": (400, 400),
+    "detail": (1000, 1000),
+    "banner": (1600, 900),
+}
+FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+_DIGEST_NAME = re.compile(rf"(?:^|/)([0-9a-f]{{{DIGEST_LENGTH}}})\.\w+$")
+_MISSING_RETRY = 60
+
+_manifests = {}
+_missing = {}
+_pool = None
+
+
+def file_digest(file):
+    digest = hashlib.sha256()
+    for chunk in File(file).chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()[:DIGEST_LENGTH]
+
+
+def name_digest(name):
+    match = _DIGEST_NAME.search(name or "")
+    return match.group(1) if match else None
+
+
+@deconstructible
+class ContentHashedUpload:
+    """
+    ``upload_to`` that only picks the directory and extension; ``ContentHashedStorage``
+    names the file by the hash of the content it saves, so derivatives never
+    change under a URL.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __call__(self, instance, filename):
+        extension = os.path.splitext(filename)[1].lower() or ".jpg"
+        return f"{self.directory}{PENDING_NAME}{extension}"
+
+    def __eq__(self, other):
+        return isinstance(other, ContentHashedUpload) and self.directory == other.directory
+
+
+class ContentHashedStorage(FileSystemStorage):
+    """
+    Stores ``ContentHashedUpload`` names as ``<digest><extension>`` of the
+    saved content, one file per digest: saving content that is already
+    stored returns its name instead of a ``_AbC1234`` copy.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        if name_digest(name) and self.exists(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        directory, basename = posixpath.split(name)
+        stem, extension = os.path.splitext(basename)
+        if stem == PENDING_NAME:
+            name = posixpath.join(directory, f"{file_digest(content)}{extension}")
+        if name_digest(name) is None:
+            return super()._save(name, content)
+        if self.exists(name):
+            return name
+        # آپلودهای هم‌زمان هر کدام در نام موقت می‌نویسند؛ محتوا یکی است و جایگزینی بی‌خطر است
+        temporary = super()._save(f"{name}.tmp", content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+
+def derived_name(digest, variant, extension):
+    return f"{DERIVED_DIR}/{digest}/{variant}.{extension}"
+
+
+def manifest_name(digest):
+    return f"{DERIVED_DIR}/{digest}/manifest.json"
+
+
+def render_variants(source_path, target_dir):
+    """
+    Write every variant of ``source_path`` into ``target_dir`` and finish with
+    ``manifest.json`` (variant -> [width, height]). Runs in a worker process,
+    so it only deals with paths and Pillow.
+    """
+    from PIL import Image
+
+    os.makedirs(target_dir, exist_ok=True)
+    manifest = {}
+    with Image.open(source_path) as source:
+        source.load()
+        has_alpha = source.mode in ("RGBA", "LA", "P")
+        rgba = source.convert("RGBA") if has_alpha else source.convert("RGB")
+        for variant, size in VARIANTS.items():
+            image = rgba.copy()
+            image.thumbnail(size, Image.LANCZOS)
+            for extension, options in FORMATS.items():
+                output = image
+                if options["format"] == "JPEG" and has_alpha:
+                    output = Image.new("RGB", image.size, (255, 255, 255))
+                    output.paste(image, mask=image.getchannel("A"))
+                output.save(os.path.join(target_dir, f"{variant}.{extension}"), **options)
+            manifest[variant] = list(image.size)
+
+    tmp_path = os.path.join(target_dir, "manifest.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(target_dir, "manifest.json"))
+    return manifest
+
+
+def generate_variants(name):
+    """Render the variants of the stored file ``name`` in this process."""
+    digest = name_digest(name)
+    if digest is None:
+        return None
+    target_dir = default_storage.path(f"{DERIVED_DIR}/{digest}")
+    return render_variants(default_storage.path(name), target_dir)
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS)
+    return _pool
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.warning("image variant generation failed: %s", future.exception())
+
+
+def schedule_variants(name):
+    """Queue variant generation for ``name`` on the process pool."""
+    digest = name_digest(name)
+    if digest is None or default_storage.exists(manifest_name(digest)):
+        return None
+    future = get_pool().submit(
+        render_variants,
+        default_storage.path(name),
+        default_storage.path(f"{DERIVED_DIR}/{digest}"),
+    )
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def get_manifest(name):
+    """
+    Variant sizes for the stored file ``name``, or None when they are not
+    generated yet. Found manifests are kept for the life of the process
+    (content-hashed, so they never change); misses are rechecked after a minute.
+    """
+    digest = name_digest(name)
+    if digest is None:
+        return None
+    if digest in _manifests:
+        return _manifests[digest]
+    if _missing.get(digest, 0) > time.monotonic():
+        return None
+    try:
+        with default_storage.open(manifest_name(digest)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        _missing[digest] = time.monotonic() + _MISSING_RETRY
+        return None
+    _manifests[digest] = manifest
+    return manifest
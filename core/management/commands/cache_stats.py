@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.caching import stats
+
+
+class Command(BaseCommand):
+    help = "Show the shared hit/miss/stale/refresh counters of cached_value"
+
+    def handle(self, *args, **options):
+        counters = stats.shared()
+        lookups = sum(counters.values()) or 1
+        for event, count in counters.items():
+            self.stdout.write(f"{event:<8} {count:>10} ({count / lookups:.1%})")
@@ -0,0 +1,71 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from categories.models import Category
+from core.images import DERIVED_DIR, file_digest, manifest_name, name_digest, render_variants
+from core.models import Banner
+from products.models import Product, ProductImages
+
+IMAGE_MODELS = [Product, ProductImages, Category, Banner]
+
+
+class Command(BaseCommand):
+    help = "Rename existing media to content-hash names and generate WebP/JPEG variants in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.IMAGE_VARIANT_WORKERS or os.cpu_count())
+        parser.add_argument("--force", action="store_true", help="Regenerate variants that already exist")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        names = set()
+        for model in IMAGE_MODELS:
+            for pk, name in model.objects.exclude(image="").exclude(image=None).values_list("pk", "image"):
+                name = self.content_hashed(model, pk, name)
+                if name:
+                    names.add(name)
+
+        pending = [
+            name for name in sorted(names)
+            if options["force"] or not default_storage.exists(manifest_name(name_digest(name)))
+        ]
+        self.stdout.write(f"{len(names)} images, {len(pending)} need variants")
+
+        failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {
+                pool.submit(
+                    render_variants,
+                    default_storage.path(name),
+                    default_storage.path(f"{DERIVED_DIR}/{name_digest(name)}"),
+                ): name
+                for name in pending
+            }
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f"⚠ {futures[future]}: {future.exception()}"))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"✅ {len(pending) - failed} generated, {failed} failed in {elapsed:.1f}s"))
+
+    def content_hashed(self, model, pk, name):
+        """Copy ``name`` to its content-hash name and point the row at it."""
+        if name_digest(name):
+            return name
+        if not default_storage.exists(name):
+            self.stdout.write(self.style.WARNING(f"⚠ missing file: {name}"))
+            return None
+        with default_storage.open(name) as f:
+            directory = os.path.dirname(name)
+            extension = os.path.splitext(name)[1].lower() or ".jpg"
+            new_name = f"{directory}/{file_digest(f)}{extension}"
+            if not default_storage.exists(new_name):
+                new_name = default_storage.save(new_name, f)
+        model.objects.filter(pk=pk).update(image=new_name)
+        return new_name
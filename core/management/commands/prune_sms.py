@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.sms import prune_sms
+
+
+class Command(BaseCommand):
+    help = "Delete old sent and failed SMS outbox rows in small batches (run from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted")
+
+    def handle(self, *args, **options):
+        prefix = "🔍 dry run: " if options["dry_run"] else "✅ "
+        messages = 0
+        for batch in prune_sms(options["batch_size"], options["dry_run"]):
+            messages += batch.messages
+            self.stdout.write(f"messages #{batch.first}-#{batch.last}: {batch.messages} in {batch.elapsed * 1000:.0f}ms")
+            time.sleep(options["pause"])
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{messages} messages removed"))
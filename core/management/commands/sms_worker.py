@@ -0,0 +1,32 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.sms import deliver
+
+
+class Command(BaseCommand):
+    help = "Deliver queued SMS messages with a thread pool, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=settings.SMS_WORKER_THREADS)
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="Drain the due messages and exit")
+
+    def handle(self, *args, **options):
+        total = 0
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            while True:
+                close_old_connections()
+                handled = deliver(pool, options["batch_size"])
+                total += handled
+                if handled:
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["poll"])
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} messages handled"))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:39
+
+import core.images
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='basebanners',
+            name='image',
+            field=models.ImageField(upload_to=core.images.ContentHashedUpload('images/')),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:00
+
+import core.images
+from django.db import migrations, models
+
+LEGACY_MODELS = {
+    'slider': 'SliderBanners',
+    'side': 'SideBanners',
+    'middle': 'MiddleBanners',
+}
+
+
+def copy_banners(apps, schema_editor):
+    Banner = apps.get_model('core', 'Banner')
+    banners = []
+    for placement, model_name in LEGACY_MODELS.items():
+        # ترتیب قبلی همان ترتیب شناسه‌ها بود
+        rows = apps.get_model('core', model_name).objects.order_by('pk').values_list('image', 'link')
+        banners.extend(
+            Banner(placement=placement, image=image, link=link, position=position)
+            for position, (image, link) in enumerate(rows)
+        )
+    Banner.objects.bulk_create(banners)
+
+
+def restore_banners(apps, schema_editor):
+    Banner = apps.get_model('core', 'Banner')
+    for placement, model_name in LEGACY_MODELS.items():
+        model = apps.get_model('core', model_name)
+        for image, link in Banner.objects.filter(placement=placement).order_by('position', 'pk').values_list('image', 'link'):
+            model.objects.create(image=image, link=link)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_otp_user_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Banner',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('placement', models.CharField(choices=[('slider', 'اسلایدر'), ('side', 'کنار اسلایدر'), ('middle', 'وسط صفحه')], max_length=10)),
+                ('image', models.ImageField(upload_to=core.images.ContentHashedUpload('images/'))),
+                ('link', models.URLField()),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('starts_at', models.DateTimeField(blank=True, null=True)),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['placement', 'position', 'id'],
+                'indexes': [models.Index(fields=['placement', 'position'], name='banner_placement_idx')],
+            },
+        ),
+        migrations.RunPython(copy_banners, restore_banners),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:01
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_banner'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='SliderBanners',
+        ),
+        migrations.DeleteModel(
+            name='SideBanners',
+        ),
+        migrations.DeleteModel(
+            name='MiddleBanners',
+        ),
+        migrations.DeleteModel(
+            name='BaseBanners',
+        ),
+    ]
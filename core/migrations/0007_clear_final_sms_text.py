@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:46
+
+from django.db import migrations
+
+
+def clear_text(apps, schema_editor):
+    SmsMessage = apps.get_model('core', 'SmsMessage')
+    SmsMessage.objects.filter(status__in=['sent', 'failed']).update(text='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_delete_legacy_banners'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_text, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,26 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.utils import timezone
 
+from .images import ContentHashedUpload
+
+
+class ManagedFieldsMixin:
+    """
+    ``save()`` of an existing row writes every field but ``MANAGED_FIELDS``,
+    which only change through their own UPDATE statements, so a stale
+    instance never overwrites them. Explicit ``update_fields`` still win.
+    """
+    MANAGED_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MANAGED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
 class UserManager(BaseUserManager):
     def create_user(self, phone, full_name=None, password=None):
         if not phone:
@@ -51,6 +71,9 @@ class OTP(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "created_at"], name="otp_user_created_idx")]
+
     def is_expired(self):
         return timezone.now() > self.expires_at
 
@@ -58,27 +81,67 @@ class OTP(models.Model):
         return f"{self.user.phone} - {self.code}"
 
 
+class SmsMessage(models.Model):
+    """Outbox row; ``manage.py sms_worker`` delivers it in the background."""
 
+    class Status(models.TextChoices):
+        PENDING = "pending", "در صف"
+        SENDING = "sending", "در حال ارسال"
+        SENT = "sent", "ارسال شده"
+        FAILED = "failed", "ناموفق"
 
+    phone = models.CharField(max_length=11)
+    text = models.TextField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # زمان تلاش بعدی؛ برای پیام در حال ارسال، پایان مهلت worker
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
 
-
-class BaseBanners(models.Model):
-    image = models.ImageField(upload_to='images/')
-    link = models.URLField()
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"], name="sms_due_idx")]
 
     def __str__(self):
-        return self.link
+        return f"{self.phone} - {self.status}"
 
-class SliderBanners(BaseBanners):
-    pass
 
+class BannerQuerySet(models.QuerySet):
+    def scheduled(self, now=None):
+        """Active banners that are live now or start later."""
+        now = now or timezone.now()
+        return self.filter(models.Q(ends_at__isnull=True) | models.Q(ends_at__gt=now), is_active=True)
 
-class SideBanners(BaseBanners):
-    pass
 
+class Banner(models.Model):
+    class Placement(models.TextChoices):
+        SLIDER = "slider", "اسلایدر"
+        SIDE = "side", "کنار اسلایدر"
+        MIDDLE = "middle", "وسط صفحه"
 
-class MiddleBanners(BaseBanners):
-    pass
+    # بیشترین تعداد بنر هر جایگاه در صفحه اصلی
+    LIMITS = {Placement.SLIDER: 5, Placement.SIDE: 2, Placement.MIDDLE: 2}
+
+    placement = models.CharField(max_length=10, choices=Placement.choices)
+    image = models.ImageField(upload_to=ContentHashedUpload('images/'))
+    link = models.URLField()
+    position = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+
+    objects = BannerQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["placement", "position", "id"]
+        indexes = [models.Index(fields=["placement", "position"], name="banner_placement_idx")]
+
+    def is_live(self, now):
+        return (self.starts_at is None or self.starts_at <= now) and (self.ends_at is None or self.ends_at > now)
+
+    def __str__(self):
+        return f"{self.get_placement_display()} - {self.link}"
 
 
 class SiteSettings(models.Model):
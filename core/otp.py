@@ -0,0 +1,93 @@
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OTP
+
+OTP_TTL = 120
+VALID, INVALID, EXPIRED = "valid", "invalid", "expired"
+
+OTPBatch = namedtuple("OTPBatch", "first last otps elapsed")
+
+_store = None
+
+
+class CacheOTPStore:
+    """
+    One live code per user, kept in the cache with a native TTL. A missing
+    key means the code expired (or was never issued); a successful check
+    deletes it, and only the caller whose ``delete`` removed it wins.
+    """
+
+    def key(self, user):
+        return f"otp:{user.pk}"
+
+    def issue(self, user, code):
+        cache.set(self.key(user), code, OTP_TTL)
+
+    def verify(self, user, code):
+        stored = cache.get(self.key(user))
+        if stored is None:
+            return EXPIRED
+        if stored != code:
+            return INVALID
+        return VALID if cache.delete(self.key(user)) else EXPIRED
+
+
+class DatabaseOTPStore:
+    """
+    ``core.OTP`` rows. Verification reads only the user's latest row through
+    the (user, created_at) index and deletes it on success.
+    """
+
+    def issue(self, user, code):
+        OTP.objects.create(user=user, code=code, expires_at=timezone.now() + timedelta(seconds=OTP_TTL))
+
+    def verify(self, user, code):
+        otp = OTP.objects.filter(user=user).order_by("-created_at").first()
+        if otp is None or otp.is_expired():
+            return EXPIRED
+        if otp.code != code:
+            return INVALID
+        deleted, _ = OTP.objects.filter(pk=otp.pk).delete()
+        return VALID if deleted else EXPIRED
+
+
+def get_otp_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.OTP_STORE)()
+    return _store
+
+
+def reset_otp_store():
+    global _store
+    _store = None
+
+
+def prune_otps(batch_size=1000, dry_run=False):
+    """
+    Delete expired ``core.OTP`` rows one primary-key range of ``batch_size``
+    at a time. Yields an ``OTPBatch`` for every range that had expired rows.
+    """
+    bounds = OTP.objects.aggregate(low=Min("pk"), high=Max("pk"))
+    if bounds["low"] is None:
+        return
+    expired = OTP.objects.filter(expires_at__lt=timezone.now())
+    for first in range(bounds["low"], bounds["high"] + 1, batch_size):
+        started = time.perf_counter()
+        in_range = expired.filter(pk__gte=first, pk__lt=first + batch_size)
+        if dry_run:
+            otps = in_range.count()
+        else:
+            with transaction.atomic():
+                otps, _ = in_range.delete()
+        if otps:
+            yield OTPBatch(first, first + batch_size - 1, otps, time.perf_counter() - started)
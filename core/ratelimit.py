@@ -0,0 +1,137 @@
+import hashlib
+import math
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+KEY = "ratelimit:{scope}:{kind}:{digest}:{window}"
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_RATE = re.compile(r"^(\d+)/(\d*)([smhd])$")
+
+
+def parse_rate(rate):
+    """``"5/10m"`` -> ``(5, 600)``: five hits per ten minutes."""
+    match = _RATE.match(rate)
+    if not match:
+        raise ValueError(f"invalid rate {rate!r}")
+    limit, count, unit = match.groups()
+    return int(limit), int(count or 1) * UNITS[unit]
+
+
+def client_ip(request):
+    # پشت nginx آدرس واقعی در X-Real-IP است
+    return request.META.get("HTTP_X_REAL_IP") or request.META.get("REMOTE_ADDR", "")
+
+
+def session_key(request):
+    # خود کوکی؛ بارگذاری session برای دیتابیسی‌ها یک کوئری است
+    return request.COOKIES.get(settings.SESSION_COOKIE_NAME, "")
+
+
+def phone_number(request):
+    return request.POST.get("phone", "").strip()
+
+
+KEY_FUNCS = {
+    "ip": client_ip,
+    "session": session_key,
+    "phone": phone_number,
+}
+
+
+class RateLimiter:
+    """
+    Sliding-window counters in the shared cache, one per (kind, value).
+
+    The estimate is the current fixed window plus the previous one weighted by
+    how much of it still overlaps the sliding window. Both windows of every
+    key are read with one ``get_many``; a request already over its rate is
+    rejected on that read alone and not counted. Allowed requests increment
+    their current windows and decide again on the values ``incr`` returned,
+    so concurrent requests can never all pass on the same old count. Counts
+    hold across processes when the backend's ``incr`` is atomic (Memcached,
+    Redis, LocMem within one process).
+    """
+
+    def __init__(self, scope, rates):
+        self.scope = scope
+        self.rates = {kind: parse_rate(rate) for kind, rate in rates.items()}
+
+    def keys(self, values, now):
+        """``{kind: (current_key, previous_key, limit, period, elapsed)}`` for non-empty values."""
+        keys = {}
+        for kind, value in values.items():
+            if not value or kind not in self.rates:
+                continue
+            limit, period = self.rates[kind]
+            window, elapsed = divmod(now, period)
+            digest = hashlib.sha1(str(value).encode()).hexdigest()[:16]
+            current = KEY.format(scope=self.scope, kind=kind, digest=digest, window=int(window))
+            previous = KEY.format(scope=self.scope, kind=kind, digest=digest, window=int(window) - 1)
+            keys[kind] = (current, previous, limit, period, elapsed)
+        return keys
+
+    def hit(self, key, period):
+        """Atomically add one to ``key`` and return the new count."""
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # پنجره‌ی قبلی هم باید تا پایان پنجره‌ی بعد خوانده شود
+            if cache.add(key, 1, period * 2):
+                return 1
+            return cache.incr(key)
+
+    def check(self, values, now=None):
+        """
+        Record a hit for ``{kind: value}`` and return 0, or the seconds to
+        wait when any of them is over its rate.
+        """
+        keys = self.keys(values, time.time() if now is None else now)
+        if not keys:
+            return 0
+        counts = cache.get_many([key for current, previous, *_ in keys.values() for key in (current, previous)])
+
+        retry_after = 0
+        for current, previous, limit, period, elapsed in keys.values():
+            weight = (period - elapsed) / period
+            if counts.get(current, 0) + counts.get(previous, 0) * weight >= limit:
+                retry_after = max(retry_after, period - elapsed)
+        if retry_after:
+            return math.ceil(retry_after)
+
+        # درخواست‌های هم‌زمان ممکن است همه از شمارش بالا رد شده باشند؛ مقدار incr تصمیم نهایی است
+        for current, previous, limit, period, elapsed in keys.values():
+            weight = (period - elapsed) / period
+            if self.hit(current, period) + counts.get(previous, 0) * weight > limit:
+                retry_after = max(retry_after, period - elapsed)
+        return math.ceil(retry_after)
+
+
+def rate_limit(scope, methods=("POST",), **rates):
+    """
+    Reject requests over ``rates`` (``kind="limit/period"``, kinds from
+    ``KEY_FUNCS``) with 429 before the view runs. A rejection costs one
+    ``get_many`` and no database queries, so it must wrap any decorator that
+    loads the user or the session.
+    """
+    limiter = RateLimiter(scope, rates)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                retry_after = limiter.check({kind: KEY_FUNCS[kind](request) for kind in limiter.rates})
+                if retry_after:
+                    response = HttpResponse("تعداد درخواست‌ها بیش از حد مجاز است؛ کمی بعد دوباره تلاش کنید.", status=429)
+                    response["Retry-After"] = str(retry_after)
+                    return response
+            return view(request, *args, **kwargs)
+
+        wrapper.limiter = limiter
+        return wrapper
+
+    return decorator
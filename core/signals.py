@@ -0,0 +1,30 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from categories.models import Category
+from products.models import Product, ProductImages
+from .context_processors import SITE_DATA
+from .images import schedule_variants
+from .models import Banner, SiteSettings
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImages)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Banner)
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    # بعد از commit تا فایل و ردیف هر دو قطعی شده باشند
+    transaction.on_commit(partial(schedule_variants, instance.image.name))
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_site_data(sender, **kwargs):
+    SITE_DATA.bump()
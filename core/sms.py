@@ -0,0 +1,172 @@
+import logging
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import SmsMessage
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 10
+# پیامی که worker برداشته و تا این مدت تمام نشده دوباره در صف قرار می‌گیرد
+LEASE_SECONDS = 120
+# پیام‌های ارسال‌شده یا ناموفق تا این مدت برای پیگیری می‌مانند
+RETENTION_DAYS = 30
+
+OTP_TEXT = '''کد تایید پرشین گیمز
+
+    کد شما: {code}
+
+    توجه: این کد محرمانه است. آن را به هیچ‌کس حتی در صورت ادعای پشتیبانی ندهید.
+
+    پرشین گیمز
+    لغو 11'''
+
+SmsBatch = namedtuple("SmsBatch", "first last messages elapsed")
+
+_provider = None
+
+
+FINAL_STATUSES = (SmsMessage.Status.SENT, SmsMessage.Status.FAILED)
+
+
+class SmsError(Exception):
+    pass
+
+
+class MelipayamakProvider:
+    """One melipayamak REST client for the whole process; safe to share between threads."""
+
+    def __init__(self):
+        from melipayamak import Api
+
+        self.client = Api(settings.MELIPAYAMAK_USERNAME, settings.MELIPAYAMAK_APIKEY).sms()
+        self.sender = settings.MELIPAYAMAK_NUMBER
+
+    def send(self, phone, text):
+        response = self.client.send(phone, self.sender, text)
+        if isinstance(response, dict) and response.get("RetStatus") != 1:
+            raise SmsError(response.get("StrRetStatus") or str(response))
+
+
+class LocalProvider:
+    """Keeps messages in memory instead of calling a provider (tests, development, load tests)."""
+
+    sent = []
+
+    def send(self, phone, text):
+        self.sent.append((phone, text))
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = import_string(settings.SMS_PROVIDER)()
+    return _provider
+
+
+def reset_provider():
+    global _provider
+    _provider = None
+
+
+def enqueue(phone, text):
+    return SmsMessage.objects.create(phone=phone, text=text)
+
+
+def enqueue_otp(phone, code):
+    return enqueue(phone, OTP_TEXT.format(code=code))
+
+
+def backoff(attempts):
+    return timedelta(seconds=BACKOFF_SECONDS * 2 ** (attempts - 1))
+
+
+def claim(batch_size):
+    """
+    Take up to ``batch_size`` due messages and mark them as sending. Rows
+    locked by another worker are skipped where the database supports it.
+    """
+    now = timezone.now()
+    due = Q(status=SmsMessage.Status.PENDING) | Q(status=SmsMessage.Status.SENDING)
+    with transaction.atomic():
+        queryset = SmsMessage.objects.filter(due, next_attempt_at__lte=now).order_by("next_attempt_at")
+        messages = list(queryset.select_for_update(skip_locked=True)[:batch_size])
+        SmsMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+            status=SmsMessage.Status.SENDING,
+            next_attempt_at=now + timedelta(seconds=LEASE_SECONDS),
+        )
+    return messages
+
+
+def send(message, provider=None):
+    """Call the provider; returns the error text or ``""``. Touches no database."""
+    try:
+        (provider or get_provider()).send(message.phone, message.text)
+    except Exception as e:
+        logger.warning("sms to %s failed: %s", message.phone, e)
+        return f"{type(e).__name__}: {e}"
+    return ""
+
+
+def record(message, error):
+    now = timezone.now()
+    message.attempts += 1
+    message.last_error = error
+    if not error:
+        message.status, message.sent_at = SmsMessage.Status.SENT, now
+    elif message.attempts >= MAX_ATTEMPTS:
+        message.status = SmsMessage.Status.FAILED
+    else:
+        message.status = SmsMessage.Status.PENDING
+        message.next_attempt_at = now + backoff(message.attempts)
+    if message.status in FINAL_STATUSES:
+        # متن پیام کد OTP را دارد؛ بعد از وضعیت نهایی نگه داشته نمی‌شود
+        message.text = ""
+    message.save(update_fields=["status", "attempts", "last_error", "next_attempt_at", "sent_at", "text"])
+
+
+def deliver(pool, batch_size=50):
+    """
+    Claim one batch, send it through ``pool`` (a thread pool sharing one
+    provider client) and record the outcome of each message. Returns the
+    number of messages handled.
+    """
+    messages = claim(batch_size)
+    provider = get_provider()
+    # فقط فراخوانی شبکه در threadها انجام می‌شود؛ دیتابیس در همین thread می‌ماند
+    for message, error in zip(messages, pool.map(lambda message: send(message, provider), messages)):
+        record(message, error)
+    return len(messages)
+
+
+def prune_sms(batch_size=1000, dry_run=False):
+    """
+    Delete sent and failed messages older than ``RETENTION_DAYS`` one
+    primary-key range of ``batch_size`` at a time. Yields an ``SmsBatch`` for
+    every range that had such rows.
+    """
+    bounds = SmsMessage.objects.aggregate(low=Min("pk"), high=Max("pk"))
+    if bounds["low"] is None:
+        return
+    old = SmsMessage.objects.filter(
+        status__in=FINAL_STATUSES,
+        created_at__lt=timezone.now() - timedelta(days=RETENTION_DAYS),
+    )
+    for first in range(bounds["low"], bounds["high"] + 1, batch_size):
+        started = time.perf_counter()
+        in_range = old.filter(pk__gte=first, pk__lt=first + batch_size)
+        if dry_run:
+            messages = in_range.count()
+        else:
+            with transaction.atomic():
+                messages, _ = in_range.delete()
+        if messages:
+            yield SmsBatch(first, first + batch_size - 1, messages, time.perf_counter() - started)
@@ -0,0 +1,50 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from core.images import derived_name, get_manifest, name_digest
+
+register = template.Library()
+
+# نسخه‌هایی که برای هر کاربرد در srcset می‌آیند و مقدار sizes آن
+ROLES = {
+    "thumb": (("thumb", "card"), "120px"),
+    "card": (("thumb", "card", "detail"), "(min-width: 768px) 25vw, 50vw"),
+    "detail": (("card", "detail", "banner"), "(min-width: 1024px) 50vw, 100vw"),
+    "banner": (("card", "detail", "banner"), "100vw"),
+}
+
+
+def _srcset(digest, manifest, variants, extension):
+    return ", ".join(
+        f"{default_storage.url(derived_name(digest, variant, extension))} {manifest[variant][0]}w"
+        for variant in variants
+        if variant in manifest
+    )
+
+
+@register.simple_tag
+def picture(image, role="card", **attrs):
+    """
+    ``<picture>`` with WebP and JPEG ``srcset`` for ``image``'s derivatives.
+    Falls back to a plain ``<img>`` of the original until they are generated.
+    """
+    if not image:
+        return ""
+    attributes = format_html_join("", ' {}="{}"', attrs.items())
+    manifest = get_manifest(image.name)
+    if manifest is None:
+        return format_html('<img src="{}"{}>', image.url, attributes)
+
+    digest = name_digest(image.name)
+    variants, sizes = ROLES[role]
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        _srcset(digest, manifest, variants, "webp"),
+        sizes,
+        default_storage.url(derived_name(digest, role, "jpg")),
+        _srcset(digest, manifest, variants, "jpg"),
+        sizes,
+        attributes,
+    )
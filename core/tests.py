@@ -1,10 +1,36 @@
-from django.test import TestCase
+import fcntl
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.contrib.auth import SESSION_KEY
 
-from core.models import OTP
+from categories.models import Category
+from core import images, otp, sms
+from core.checks import otp_store_cache
+from core.caching import LOCAL_VERSION_TIMEOUT, cached_value, single_flight, stats, version_timeout
+from core.context_processors import SITE_DATA, site_settings
+from core.models import SiteSettings
+from core.ratelimit import RateLimiter, parse_rate
+from core.models import OTP, SmsMessage
 
 User = get_user_model()
 
@@ -44,3 +70,446 @@ class TestOTP(TestCase):
         )
         self.assertFalse(otp.is_expired())
 
+
+def _sent_code():
+    return re.search(r"\d{6}", SmsMessage.objects.latest("pk").text).group()
+
+
+class TestOTPStore(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        otp.reset_otp_store()
+        self.addCleanup(otp.reset_otp_store)
+        self.user = User.objects.create_user("09120000000", password="1234")
+
+    def check_store(self, store):
+        self.assertEqual(store.verify(self.user, "123456"), otp.EXPIRED)
+        store.issue(self.user, "123456")
+        self.assertEqual(store.verify(self.user, "654321"), otp.INVALID)
+        self.assertEqual(store.verify(self.user, "123456"), otp.VALID)
+        # هر کد فقط یک بار
+        self.assertEqual(store.verify(self.user, "123456"), otp.EXPIRED)
+
+    def test_cache_store(self):
+        self.check_store(otp.CacheOTPStore())
+        self.assertFalse(OTP.objects.exists())
+
+    def test_database_store(self):
+        self.check_store(otp.DatabaseOTPStore())
+
+    def test_database_verify_does_not_grow_with_history(self):
+        store = otp.DatabaseOTPStore()
+        for code in ("111111", "222222", "333333"):
+            store.issue(self.user, code)
+        with self.assertNumQueries(1):
+            self.assertEqual(store.verify(self.user, "111111"), otp.INVALID)
+        OTP.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(store.verify(self.user, "333333"), otp.EXPIRED)
+
+    def test_cache_store_with_local_cache_warns(self):
+        self.assertEqual(otp_store_cache(None), [])
+        with override_settings(OTP_STORE="core.otp.CacheOTPStore"):
+            self.assertEqual([warning.id for warning in otp_store_cache(None)], ["core.W001"])
+
+    def test_login_flow(self):
+        self.client.post(reverse("request_otp"), {"phone": "09120000000"})
+        response = self.client.post(reverse("verify_otp"), {"code": _sent_code()})
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session[SESSION_KEY]), self.user.pk)
+
+    def test_prune_otps(self):
+        store = otp.DatabaseOTPStore()
+        for _ in range(5):
+            store.issue(self.user, "123456")
+        OTP.objects.filter(pk__in=list(OTP.objects.values_list("pk", flat=True)[:3])).update(
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        out = io.StringIO()
+        call_command("prune_otps", "--dry-run", "--batch-size", "2", "--pause", "0", stdout=out)
+        self.assertIn("🔍 dry run: 3 otps removed", out.getvalue())
+        self.assertEqual(OTP.objects.count(), 5)
+        call_command("prune_otps", "--batch-size", "2", "--pause", "0", stdout=io.StringIO())
+        self.assertEqual(OTP.objects.count(), 2)
+
+
+class FlakyProvider(sms.LocalProvider):
+    failures = 0
+
+    def send(self, phone, text):
+        if FlakyProvider.failures:
+            FlakyProvider.failures -= 1
+            raise sms.SmsError("provider down")
+        super().send(phone, text)
+
+
+@override_settings(SMS_PROVIDER="core.tests.FlakyProvider")
+class TestSmsOutbox(TestCase):
+
+    def setUp(self):
+        sms.reset_provider()
+        sms.LocalProvider.sent.clear()
+        FlakyProvider.failures = 0
+        self.pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.pool.shutdown)
+        self.addCleanup(sms.reset_provider)
+
+    def test_request_otp_only_enqueues(self):
+        response = self.client.post(reverse("request_otp"), {"phone": "09121112233"})
+        self.assertRedirects(response, reverse("verify_otp"), fetch_redirect_response=False)
+        message = SmsMessage.objects.get()
+        self.assertEqual(message.status, SmsMessage.Status.PENDING)
+        self.assertRegex(message.text, r"\d{6}")
+        self.assertEqual(sms.LocalProvider.sent, [])
+
+    def test_worker_delivers_batch(self):
+        for i in range(3):
+            sms.enqueue(f"0912000000{i}", "hello")
+        self.assertEqual(sms.deliver(self.pool), 3)
+        self.assertEqual(len(sms.LocalProvider.sent), 3)
+        self.assertEqual(SmsMessage.objects.filter(status=SmsMessage.Status.SENT).count(), 3)
+        self.assertEqual(sms.LocalProvider.sent[0][1], "hello")
+        self.assertFalse(SmsMessage.objects.exclude(text="").exists())
+        self.assertEqual(sms.deliver(self.pool), 0)
+
+    def test_failure_is_retried_with_backoff(self):
+        FlakyProvider.failures = 1
+        message = sms.enqueue("09120000000", "hello")
+        with self.assertLogs("core.sms", "WARNING"):
+            sms.deliver(self.pool)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (SmsMessage.Status.PENDING, 1))
+        self.assertIn("provider down", message.last_error)
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        # هنوز زمان تلاش دوباره نرسیده
+        self.assertEqual(sms.deliver(self.pool), 0)
+
+        SmsMessage.objects.update(next_attempt_at=timezone.now())
+        sms.deliver(self.pool)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (SmsMessage.Status.SENT, 2))
+
+    def test_gives_up_after_max_attempts(self):
+        FlakyProvider.failures = sms.MAX_ATTEMPTS
+        message = sms.enqueue("09120000000", "hello")
+        for _ in range(sms.MAX_ATTEMPTS):
+            SmsMessage.objects.update(next_attempt_at=timezone.now())
+            with self.assertLogs("core.sms", "WARNING"):
+                sms.deliver(self.pool)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.text), (SmsMessage.Status.FAILED, ""))
+        self.assertEqual(sms.LocalProvider.sent, [])
+
+    def test_abandoned_message_is_claimed_again(self):
+        sms.enqueue("09120000000", "hello")
+        sms.claim(10)
+        self.assertEqual(sms.claim(10), [])
+        SmsMessage.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(sms.claim(10)), 1)
+
+    def test_prune_sms(self):
+        for status in (SmsMessage.Status.SENT, SmsMessage.Status.FAILED, SmsMessage.Status.PENDING, SmsMessage.Status.SENT):
+            SmsMessage.objects.create(phone="09120000000", text="", status=status)
+        recent = SmsMessage.objects.create(phone="09120000000", text="", status=SmsMessage.Status.SENT)
+        SmsMessage.objects.exclude(pk=recent.pk).update(created_at=timezone.now() - timedelta(days=sms.RETENTION_DAYS + 1))
+
+        out = io.StringIO()
+        call_command("prune_sms", "--dry-run", "--batch-size", "2", "--pause", "0", stdout=out)
+        self.assertIn("3 messages removed", out.getvalue())
+        self.assertEqual(SmsMessage.objects.count(), 5)
+
+        call_command("prune_sms", "--batch-size", "2", "--pause", "0", stdout=io.StringIO())
+        self.assertEqual(
+            sorted(SmsMessage.objects.values_list("status", flat=True)),
+            [SmsMessage.Status.PENDING, SmsMessage.Status.SENT],
+        )
+
+    def test_provider_is_reused(self):
+        self.assertIs(sms.get_provider(), sms.get_provider())
+
+
+class LockedFileBasedCache(FileBasedCache):
+    """File cache whose ``incr``/``add`` are atomic across processes, like Memcached or Redis."""
+
+    @contextmanager
+    def locked(self):
+        with open(os.path.join(self._dir, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def incr(self, *args, **kwargs):
+        with self.locked():
+            return super().incr(*args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        with self.locked():
+            return super().add(*args, **kwargs)
+
+
+def _check_in_process(limiter, start, results, now):
+    start.wait()
+    results.put([limiter.check({"phone": "09120000000"}, now) for _ in range(3)])
+
+
+class TestRateLimit(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("5/10m"), (5, 600))
+        self.assertEqual(parse_rate("100/d"), (100, 86400))
+        with self.assertRaises(ValueError):
+            parse_rate("5 per minute")
+
+    def test_sliding_window(self):
+        limiter = RateLimiter("test", {"ip": "2/m"})
+        self.assertEqual(limiter.check({"ip": "1.1.1.1"}, now=600), 0)
+        self.assertEqual(limiter.check({"ip": "1.1.1.1"}, now=610), 0)
+        self.assertEqual(limiter.check({"ip": "1.1.1.1"}, now=620), 40)
+        self.assertEqual(limiter.check({"ip": "2.2.2.2"}, now=620), 0)
+        # درخواست ردشده شمرده نمی‌شود: 2 در پنجره‌ی قبل، با وزن یک‌سوم
+        self.assertEqual(limiter.check({"ip": "1.1.1.1"}, now=700), 0)
+        self.assertEqual(limiter.check({"ip": "1.1.1.1"}, now=700), 20)
+        self.assertEqual(limiter.check({"ip": "1.1.1.1"}, now=700), 20)
+
+    def test_concurrent_checks_respect_limit(self):
+        limiter = RateLimiter("test", {"phone": "3/h"})
+        get_many = LocMemCache.get_many
+
+        # هر نخ کش خودش را دارد؛ کند کردن کلاس همه را کند می‌کند
+        def slow_get_many(self, *args, **kwargs):
+            values = get_many(self, *args, **kwargs)
+            time.sleep(0.01)
+            return values
+
+        with mock.patch.object(LocMemCache, "get_many", slow_get_many), ThreadPoolExecutor(max_workers=20) as pool:
+            results = list(pool.map(lambda _: limiter.check({"phone": "09120000000"}, 3600), range(20)))
+        self.assertEqual(results.count(0), 3)
+
+    def test_request_otp_limited_per_phone(self):
+        for _ in range(3):
+            response = self.client.post(reverse("request_otp"), {"phone": "09121112233"})
+            self.assertEqual(response.status_code, 302)
+
+        with mock.patch("core.ratelimit.cache", wraps=cache) as spy, self.assertNumQueries(0):
+            response = self.client.post(reverse("request_otp"), {"phone": "09121112233"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        # رد کردن فقط یک رفت‌وبرگشت به کش است و چیزی را زیاد نمی‌کند
+        self.assertEqual(spy.get_many.call_count, 1)
+        self.assertFalse(spy.incr.called or spy.add.called)
+        self.assertEqual(SmsMessage.objects.count(), 3)
+
+    def test_verify_otp_limited_per_session(self):
+        self.client.post(reverse("request_otp"), {"phone": "09121112233"})
+        for _ in range(5):
+            self.client.post(reverse("verify_otp"), {"code": "000000"})
+        code = _sent_code()
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse("verify_otp"), {"code": code})
+        self.assertEqual(response.status_code, 429)
+        self.assertNotIn(SESSION_KEY, self.client.session)
+
+    def test_limit_is_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            "default": {"BACKEND": "core.tests.LockedFileBasedCache", "LOCATION": location},
+        }):
+            limiter = RateLimiter("test", {"phone": "5/h"})
+            context = multiprocessing.get_context("fork")
+            start, results = context.Event(), context.Queue()
+            processes = [
+                context.Process(target=_check_in_process, args=(limiter, start, results, 3600))
+                for _ in range(4)
+            ]
+            for process in processes:
+                process.start()
+            # همه‌ی پروسه‌ها با هم شروع می‌کنند
+            start.set()
+            allowed = [retry_after == 0 for _ in processes for retry_after in results.get(timeout=10)]
+            for process in processes:
+                process.join()
+            self.assertEqual(allowed.count(True), 5)
+
+
+class TestCachedValue(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def build(self):
+        self.calls += 1
+        return f"value-{self.calls}"
+
+    def test_miss_then_hit(self):
+        self.assertEqual(cached_value("k", self.build, 60), "value-1")
+        self.assertEqual(cached_value("k", self.build, 60), "value-1")
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_served_while_locked(self):
+        cache.set("k", ("old", time.time() - 1, 0), 60)
+        with single_flight("k") as leader:
+            self.assertTrue(leader)
+            self.assertEqual(cached_value("k", self.build, 60), "old")
+        self.assertEqual(self.calls, 0)
+
+        self.assertEqual(cached_value("k", self.build, 60), "value-1")
+        self.assertEqual(cached_value("k", self.build, 60), "value-1")
+
+    def test_cold_miss_builds_after_wait(self):
+        with single_flight("k"):
+            self.assertEqual(cached_value("k", self.build, 60, wait=0), "value-1")
+
+    def test_probabilistic_early_refresh(self):
+        cache.set("k", ("old", time.time() + 30, 1.0), 60)
+        self.assertEqual(cached_value("k", self.build, 60, beta=1e9), "value-1")
+
+    def test_stats(self):
+        before = dict(stats.local)
+        cached_value("k", self.build, 60)
+        cached_value("k", self.build, 60)
+        self.assertEqual(stats.local["miss"] - before.get("miss", 0), 1)
+        self.assertEqual(stats.local["hit"] - before.get("hit", 0), 1)
+        self.assertGreaterEqual(stats.shared()["hit"], 1)
+
+
+class TestSiteData(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        SITE_DATA.clear_local()
+        self.addCleanup(SITE_DATA.clear_local)
+        SiteSettings.objects.create(footer_contact="@support")
+        self.category = Category.objects.create(name="Cat1", slug="cat1")
+
+    def test_warm_render_makes_no_queries_and_one_cache_call(self):
+        with self.assertNumQueries(2):
+            site_settings(None)
+        with mock.patch("core.caching.cache", wraps=cache) as spy, self.assertNumQueries(0):
+            context = site_settings(None)
+        self.assertEqual(spy.method_calls, [mock.call.get(SITE_DATA.version_key)])
+        self.assertEqual(context["site_settings"].footer_contact, "@support")
+        self.assertEqual([category.slug for category in context["categories"]], ["cat1"])
+
+    def test_other_workers_read_l2(self):
+        site_settings(None)
+        # worker دیگر: L1 خالی ولی کش مشترک پر است
+        SITE_DATA.clear_local()
+        with self.assertNumQueries(0):
+            site_settings(None)
+
+    def test_save_signals_invalidate(self):
+        site_settings(None)
+        self.category.name = "Renamed"
+        self.category.save()
+        SiteSettings.objects.update(footer_contact="x")
+        SiteSettings.objects.get().save()
+        context = site_settings(None)
+        self.assertEqual(context["categories"][0].name, "Renamed")
+        self.assertEqual(context["site_settings"].footer_contact, "x")
+
+    def test_version_expires_on_process_local_cache(self):
+        with mock.patch("core.caching.cache", wraps=cache) as spy:
+            SITE_DATA.bump()
+        spy.set.assert_called_once_with(SITE_DATA.version_key, mock.ANY, LOCAL_VERSION_TIMEOUT)
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location},
+        }):
+            self.assertIsNone(version_timeout())
+
+    def test_values_are_immutable(self):
+        context = site_settings(None)
+        with self.assertRaises(AttributeError):
+            context["site_settings"].footer_contact = "changed"
+        self.assertIsInstance(context["categories"], tuple)
+
+
+class TestImageVariants(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        images._manifests.clear()
+        images._missing.clear()
+
+    def upload(self, size=(1200, 800), color=(200, 30, 30)):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", size, color).save(buffer, "PNG")
+        return SimpleUploadedFile("photo.PNG", buffer.getvalue(), content_type="image/png")
+
+    def test_upload_named_by_content_hash(self):
+        first = Category.objects.create(name="a", slug="a", image=self.upload())
+        second = Category.objects.create(name="b", slug="b", image=self.upload())
+        digest = images.name_digest(first.image.name)
+        self.assertIsNotNone(digest)
+        self.assertEqual(first.image.name, f"images/{digest}.png")
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "images")), [f"{digest}.png"])
+
+    def test_replacing_image_hashes_new_content(self):
+        category = Category(name="a", slug="a")
+        category.image.save("first.png", self.upload())
+        first = category.image.name
+        new = self.upload(color=(30, 200, 30))
+        new_digest = images.file_digest(new)
+
+        category.image.save("second.png", new)
+        category.refresh_from_db()
+        self.assertNotEqual(category.image.name, first)
+        self.assertEqual(category.image.name, f"images/{new_digest}.png")
+        with category.image.open() as f:
+            self.assertEqual(images.file_digest(f), new_digest)
+
+    def test_render_variants_writes_manifest(self):
+        category = Category.objects.create(name="a", slug="a", image=self.upload())
+        manifest = images.generate_variants(category.image.name)
+
+        self.assertEqual(manifest["thumb"], [200, 133])
+        self.assertEqual(manifest["detail"], [1000, 667])
+        self.assertEqual(manifest["banner"], [1200, 800])
+        digest = images.name_digest(category.image.name)
+        for variant in images.VARIANTS:
+            for extension in images.FORMATS:
+                path = os.path.join(self.media_root, images.derived_name(digest, variant, extension))
+                self.assertTrue(os.path.exists(path))
+        self.assertEqual(images.get_manifest(category.image.name), manifest)
+
+    def render(self, category):
+        template = Template('{% load image_tags %}{% picture category.image "card" alt="" class="w-32" %}')
+        return template.render(Context({"category": category}))
+
+    def test_picture_falls_back_to_original(self):
+        category = Category.objects.create(name="a", slug="a", image=self.upload())
+        html = self.render(category)
+        self.assertEqual(html, f'<img src="{category.image.url}" alt="" class="w-32">')
+
+    def test_picture_srcset(self):
+        category = Category.objects.create(name="a", slug="a", image=self.upload())
+        images.generate_variants(category.image.name)
+        digest = images.name_digest(category.image.name)
+
+        html = self.render(category)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(f"derived/{digest}/card.webp 400w", html)
+        self.assertIn(f'src="/media/derived/{digest}/card.jpg"', html)
+        self.assertIn(f"derived/{digest}/detail.jpg 1000w", html)
+        self.assertIn('class="w-32"', html)
+
+    def test_backfill_command_renames_legacy_files(self):
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+
+        legacy = default_storage.save("images/legacy.png", self.upload())
+        category = Category.objects.create(name="a", slug="a")
+        Category.objects.filter(pk=category.pk).update(image=legacy)
+
+        call_command("generate_image_variants", workers=1, stdout=io.StringIO())
+        category.refresh_from_db()
+        self.assertIsNotNone(images.name_digest(category.image.name))
+        self.assertIsNotNone(images.get_manifest(category.image.name))
@@ -1,36 +1,18 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from core.models import CustomUser, OTP
-from django.utils import timezone
-import datetime
+from core.models import CustomUser
 import random
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
-from melipayamak import Api
+from django.core.paginator import Paginator
+from core.otp import EXPIRED, INVALID, get_otp_store
+from core.ratelimit import rate_limit
+from core.sms import enqueue_otp
 from orders.models import Order
 
-from environs import Env
-env = Env()
-env.read_env()
-
-def send_sms(phone, code):
-    username = env("MELIPAYAMAK_USERNAME")
-    password = env("MELIPAYAMAK_APIKEY")
-    api = Api(username, password)
-    sms = api.sms()
-    to = phone
-    _from = env("MELIPAYAMAK_NUMBER")
-    text = f'''کد تایید پرشین گیمز
-
-    کد شما: {code}
-
-    توجه: این کد محرمانه است. آن را به هیچ‌کس حتی در صورت ادعای پشتیبانی ندهید.
-
-    پرشین گیمز
-    لغو 11'''
-
-    response = sms.send(to, _from, text)
+ORDERS_PER_PAGE = 10
 
+@rate_limit("request_otp", phone="3/10m", session="5/10m", ip="20/h")
 def request_otp(request):
     if request.method == "POST":
         phone = request.POST.get("phone")
@@ -46,18 +28,17 @@ def request_otp(request):
         user, created = CustomUser.objects.get_or_create(phone=phone, defaults={"full_name": full_name})
 
         code = str(random.randint(100000, 999999))
-        OTP.objects.create(
-            user=user,
-            code=code,
-            expires_at=timezone.now() + datetime.timedelta(minutes=2)
-        )
+        get_otp_store().issue(user, code)
         request.session["phone"] = phone
-        send_sms(phone, code)
+        # ارسال واقعی با manage.py sms_worker انجام می‌شود
+        enqueue_otp(phone, code)
         messages.success(request, "کد تایید ارسال شد")
         return redirect("verify_otp")
 
     return redirect("login")
 
+# شماره در session است؛ خواندن آن یک کوئری دارد، پس محدودیت روی کوکی session و IP است
+@rate_limit("verify_otp", session="5/5m", ip="30/10m")
 def verify_otp(request):
     if request.method == "POST":
         phone = request.session.get("phone")
@@ -66,13 +47,13 @@ def verify_otp(request):
 
         try:
             user = CustomUser.objects.get(phone=phone)
-            otp = user.otps.filter(code=code).last()
+            result = get_otp_store().verify(user, code)
 
-            if not otp:
+            if result == INVALID:
                 messages.error(request, "کد اشتباه است")
                 return redirect("verify_otp")
 
-            if otp.is_expired():
+            if result == EXPIRED:
                 messages.error(request, "کد منقضی شده")
                 return redirect("request_otp")
 
@@ -111,8 +92,10 @@ def logout_view(request):
 
 @login_required()
 def dashboard_view(request):
-    user_orders = Order.objects.prefetch_related("items").filter(user=request.user)
-    return render(request, "core/profile.html", {'orders': user_orders})
+    # جمع سفارش روی خود Order ذخیره است؛ آیتم‌ها خوانده نمی‌شوند
+    user_orders = Order.objects.filter(user=request.user).order_by("-id")
+    orders = Paginator(user_orders, ORDERS_PER_PAGE).get_page(request.GET.get("page"))
+    return render(request, "core/profile.html", {'orders': orders})
 
 def contact_us_view(request):
     return render(request, "core/contact.html")
@@ -0,0 +1,148 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from cart.storage import ITEM_RELATED
+from products import stock
+from .models import Order, OrderItem, Reservation
+
+
+class EmptyCart(Exception):
+    pass
+
+
+def snapshot(item):
+    """OrderItem with the prices of ``item`` frozen at checkout time."""
+    org_price = item.get_item_org_total()
+    final_price = item.item_final_price()
+    return OrderItem(
+        product_id=item.product_id,
+        capacity_id=item.capacity_id,
+        quantity=item.quantity,
+        org_price=org_price,
+        final_price=final_price,
+        total_discount=org_price - final_price,
+    )
+
+
+def place_order(user, order, idempotency_key=None):
+    """
+    Turn ``user``'s cart into ``order`` (unsaved, e.g. from ``OrderForm``) in
+    one transaction: lock the cart, snapshot every line, take the totals
+    from ``Cart.objects.with_totals()``, bulk insert the items, reserve
+    tracked stock (``stock.OutOfStock`` rolls everything back) and delete
+    the cart. Returns ``(order, created)``; a checkout
+    repeated with the same ``idempotency_key`` gets the first order back.
+    """
+    with transaction.atomic():
+        # درخواست دوم همین‌جا منتظر می‌ماند تا اولی تمام شود
+        cart = Cart.objects.select_for_update().filter(user=user).first()
+        if idempotency_key:
+            existing = Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+            if existing is not None:
+                return existing, False
+
+        items = list(CartItem.objects.filter(cart=cart).select_related(*ITEM_RELATED)) if cart else []
+        if not items:
+            raise EmptyCart
+
+        lines = [snapshot(item) for item in items]
+        totals = Cart.objects.with_totals().get(pk=cart.pk)
+        order.user = user
+        order.idempotency_key = idempotency_key or None
+        order.org_price = totals.org_total
+        order.final_price = totals.final_total
+        order.total_discount = totals.discount_total
+        order.save()
+        for line in lines:
+            line.order = order
+        OrderItem.objects.bulk_create(lines)
+        reserve_stock(order, lines)
+        cart.delete()
+
+        if not user.full_name and order.full_name:
+            user.full_name = order.full_name
+            user.save(update_fields=["full_name"])
+    return order, True
+
+
+def line_quantities(lines):
+    """``{(product_id, capacity_id): quantity}`` summed over ``lines``."""
+    quantities = Counter()
+    for line in lines:
+        quantities[(line.product_id, line.capacity_id)] += line.quantity
+    return quantities
+
+
+def reserve_stock(order, lines):
+    reserved = stock.reserve(line_quantities(lines))
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+    Reservation.objects.bulk_create(
+        Reservation(order=order, stock_id=stock_id, quantity=quantity, expires_at=expires_at)
+        for stock_id, quantity in reserved.items()
+    )
+
+
+def _take_reservations(reservations):
+    """Delete ``reservations`` under a row lock and return ``{stock_id: quantity}``."""
+    rows = list(reservations.select_for_update().values_list("pk", "stock_id", "quantity"))
+    quantities = defaultdict(int)
+    for _, stock_id, quantity in rows:
+        quantities[stock_id] += quantity
+    Reservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    return quantities
+
+
+def release_reservations(order_ids):
+    """Cancelled orders give their reserved units back."""
+    with transaction.atomic():
+        stock.release(_take_reservations(Reservation.objects.filter(order_id__in=order_ids)))
+
+
+def commit_reservations(order_id):
+    """
+    Paid orders take their reserved units out of ``on_hand``, once. An order
+    whose reservation already expired reserves its items again first, so a
+    late payment raises ``stock.OutOfStock`` instead of overselling.
+    """
+    with transaction.atomic():
+        # پرچم با UPDATE شرطی؛ ذخیره‌های هم‌زمان فقط یک بار برداشت می‌کنند
+        if not Order.objects.filter(pk=order_id, stock_committed=False).update(stock_committed=True):
+            return
+        reserved = _take_reservations(Reservation.objects.filter(order_id=order_id))
+        if not reserved:
+            reserved = stock.reserve(line_quantities(OrderItem.objects.filter(order_id=order_id)))
+        stock.commit(reserved)
+
+
+def expire_reservations(batch_size=500):
+    """
+    Cancel waiting orders whose reservation expired and release their stock,
+    ``batch_size`` orders per transaction. Returns the number of cancelled orders.
+    """
+    cancelled = 0
+    now = timezone.now()
+    while True:
+        order_ids = list(
+            Reservation.objects
+            .filter(expires_at__lt=now, order__status=Order.Status.WAITING)
+            .values_list("order_id", flat=True)
+            .distinct()[:batch_size]
+        )
+        if not order_ids:
+            return cancelled
+        with transaction.atomic():
+            # سفارشی که در این فاصله پرداخت شده قفل می‌شود و دیگر WAITING نیست
+            expired = list(
+                Order.objects.select_for_update()
+                .filter(pk__in=order_ids, status=Order.Status.WAITING)
+                .values_list("pk", flat=True)
+            )
+            # update سیگنال ندارد؛ آزادسازی همین‌جا انجام می‌شود
+            Order.objects.filter(pk__in=expired).update(status=Order.Status.Cancelled)
+            release_reservations(expired)
+        cancelled += len(expired)
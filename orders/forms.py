@@ -1,9 +1,12 @@
+from django import forms
 from django.forms import ModelForm
 
 from orders.models import Order
 
 
 class OrderForm(ModelForm):
+    idempotency_key = forms.CharField(max_length=64, required=False)
+
     class Meta:
         model = Order
         fields = [
@@ -15,4 +18,4 @@ class OrderForm(ModelForm):
             'postal_code',
             'address',
             'description',
-        ]
\ No newline at end of file
+        ]
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.sales import reconcile_total_sell
+
+
+class Command(BaseCommand):
+    help = "Recompute Product.total_sell from the items of paid orders (run periodically, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        corrected = reconcile_total_sell(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"✅ {corrected} products corrected"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.checkout import expire_reservations
+
+
+class Command(BaseCommand):
+    help = "Cancel unpaid orders whose stock reservation expired and release the stock (run periodically, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        cancelled = expire_reservations(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"✅ {cancelled} orders cancelled"))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+
+    Order.objects.filter(status='P').update(sales_counted=True)
+    totals = (
+        OrderItem.objects
+        .filter(order__status='P')
+        .values('product')
+        .annotate(quantity=models.Sum('quantity'))
+        .values_list('product', 'quantity')
+    )
+    for product_id, quantity in totals:
+        Product.objects.filter(pk=product_id).update(total_sell=quantity)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+        ('products', '0005_best_sell_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='sales_counted',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:44
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+
+    items = OrderItem.objects.filter(order=models.OuterRef('pk')).order_by().values('order')
+    Order.objects.update(**{
+        field: Coalesce(models.Subquery(items.annotate(total=models.Sum(field)).values('total')), 0)
+        for field in ('org_price', 'total_discount', 'final_price')
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='final_price',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='org_price',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_discount',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
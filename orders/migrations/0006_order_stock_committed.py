@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.filter(status='P').update(stock_committed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_committed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,23 @@
 from django.db import models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 
-from products.models import Product, Capacity
+from core.models import ManagedFieldsMixin
+from products.models import Product, Capacity, Stock
 
 
-class Order(models.Model):
+class OrderQuerySet(models.QuerySet):
+    def refresh_totals(self):
+        """Recompute the stored totals of these orders from their items in one UPDATE."""
+        items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        return self.update(**{
+            field: Coalesce(Subquery(items.annotate(total=Sum(field)).values('total')), 0)
+            for field in Order.TOTAL_FIELDS
+        })
+
+
+class Order(ManagedFieldsMixin, models.Model):
     class Status(models.TextChoices):
         WAITING = "W", "Waiting"
         Paid = "P", "Paid"
@@ -23,17 +36,31 @@ class Order(models.Model):
     description = models.CharField(max_length=150, blank=True)
 
     status = models.CharField(max_length=150, choices=Status.choices, default=Status.WAITING)
+    # آیا تعداد فروش این سفارش در Product.total_sell حساب شده است
+    sales_counted = models.BooleanField(default=False, editable=False)
+    # آیا موجودی این سفارش از on_hand برداشته شده است
+    stock_committed = models.BooleanField(default=False, editable=False)
+    # جمع قیمت آیتم‌ها؛ هنگام ثبت سفارش پر و با تغییر آیتم‌ها دوباره حساب می‌شود
+    org_price = models.PositiveIntegerField(default=0, editable=False)
+    total_discount = models.PositiveIntegerField(default=0, editable=False)
+    final_price = models.PositiveIntegerField(default=0, editable=False)
+    # کلید فرم ثبت سفارش؛ ارسال دوباره‌ی همان فرم سفارش تازه نمی‌سازد
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def org_price(self):
-        return sum([item.org_price for item in self.items.all()])
+    objects = OrderQuerySet.as_manager()
+
+    TOTAL_FIELDS = ('org_price', 'total_discount', 'final_price')
+    # جمع‌ها با OrderQuerySet.refresh_totals و پرچم‌ها با UPDATE شرطی orders.sales و orders.checkout
+    # عوض می‌شوند؛ نمونه‌ی کهنه رویشان نمی‌نویسد
+    MANAGED_FIELDS = TOTAL_FIELDS + ('sales_counted', 'stock_committed')
 
-    def total_discount(self):
-        return sum([item.total_discount for item in self.items.all()])
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='order_unique_idempotency_key'),
+        ]
 
-    def final_price(self):
-        return sum([item.final_price for item in self.items.all()])
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.PROTECT, related_name="items")
@@ -47,3 +74,11 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.product}"
+
+
+class Reservation(models.Model):
+    """Stock held for an unpaid order until it is paid, cancelled or expires."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="reservations")
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name="+")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
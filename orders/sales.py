@@ -0,0 +1,110 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from products import home, ranking
+from products.models import Product
+from .models import Order, OrderItem
+
+
+def _invalidate_rankings():
+    ranking.bump_version()
+    home.bump_version("best_sellers")
+
+
+def _add_to_total_sell(quantities):
+    """``total_sell += quantity`` for every product in one UPDATE."""
+    if not quantities:
+        return 0
+    delta = Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return Product.objects.filter(pk__in=quantities).update(total_sell=F("total_sell") + delta)
+
+
+def order_quantities(order_id):
+    return dict(
+        OrderItem.objects
+        .filter(order_id=order_id)
+        .values("product")
+        .annotate(quantity=Sum("quantity"))
+        .values_list("product", "quantity")
+    )
+
+
+def sync_order_sales(order):
+    """
+    Count ``order`` in ``total_sell`` when it is Paid and take it back when a
+    counted order leaves Paid. ``sales_counted`` is flipped with a conditional
+    UPDATE first, so concurrent saves count an order at most once.
+    """
+    paid = order.status == Order.Status.Paid
+    with transaction.atomic():
+        flipped = (
+            Order.objects
+            .filter(pk=order.pk, status=order.status, sales_counted=not paid)
+            .update(sales_counted=paid)
+        )
+        if not flipped:
+            return False
+        quantities = order_quantities(order.pk)
+        if not paid:
+            quantities = {pk: -quantity for pk, quantity in quantities.items()}
+        _add_to_total_sell(quantities)
+        transaction.on_commit(_invalidate_rankings)
+    order.sales_counted = paid
+    return True
+
+
+def _counted_quantities(product_ids):
+    """Units of ``product_ids`` in the orders already counted in ``total_sell``."""
+    return dict(
+        OrderItem.objects
+        .filter(order__sales_counted=True, product__in=product_ids)
+        .values("product")
+        .annotate(quantity=Sum("quantity"))
+        .values_list("product", "quantity")
+    )
+
+
+def reconcile_total_sell(batch_size=500):
+    """
+    Mark Paid orders as counted (and the rest as not), then recompute
+    ``total_sell`` from the counted orders ``batch_size`` products at a time.
+    Only drifted products are locked, and their sums are read again under the
+    lock. Returns the number of corrected products.
+    """
+    with transaction.atomic():
+        Order.objects.filter(status=Order.Status.Paid, sales_counted=False).update(sales_counted=True)
+        Order.objects.exclude(status=Order.Status.Paid).filter(sales_counted=True).update(sales_counted=False)
+
+    corrected = 0
+    last_pk = 0
+    while True:
+        stored = dict(
+            Product.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", "total_sell")[:batch_size]
+        )
+        if not stored:
+            break
+        last_pk = max(stored)
+        counted = _counted_quantities(list(stored))
+        drifted = [pk for pk, total_sell in stored.items() if counted.get(pk, 0) != total_sell]
+        if not drifted:
+            continue
+        with transaction.atomic():
+            # اول قفل و بعد جمع: sync_order_sales هم‌زمان یا در جمع آمده یا بعد از ما اضافه می‌کند
+            locked = dict(
+                Product.objects.select_for_update().filter(pk__in=drifted).order_by("pk").values_list("pk", "total_sell")
+            )
+            counted = _counted_quantities(list(locked))
+            drift = {
+                pk: counted.get(pk, 0) - total_sell
+                for pk, total_sell in locked.items()
+                if counted.get(pk, 0) != total_sell
+            }
+            _add_to_total_sell(drift)
+        corrected += len(drift)
+    if corrected:
+        transaction.on_commit(_invalidate_rankings)
+    return corrected
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .checkout import commit_reservations, release_reservations
+from .models import Order, OrderItem
+from .sales import sync_order_sales
+
+
+@receiver(post_save, sender=Order)
+def count_order_sales(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if (instance.status == Order.Status.Paid) != instance.sales_counted:
+        sync_order_sales(instance)
+
+
+@receiver(post_save, sender=Order)
+def settle_reservations(sender, instance, raw=False, created=False, **kwargs):
+    # رزروها هنگام ثبت سفارش و بعد از اولین save ساخته می‌شوند
+    if raw or created:
+        return
+    if instance.status == Order.Status.Paid:
+        commit_reservations(instance.pk)
+    elif instance.status == Order.Status.Cancelled:
+        release_reservations([instance.pk])
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_order_totals(sender, instance, raw=False, **kwargs):
+    # ثبت سفارش آیتم‌ها را با bulk_create می‌سازد و جمع‌ها را خودش می‌نویسد
+    if raw:
+        return
+    Order.objects.filter(pk=instance.order_id).refresh_totals()
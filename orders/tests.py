@@ -1,11 +1,25 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 from cart.models import Cart, CartItem
-from products.models import Product, Discount, Capacity
+from products.models import Product, Discount, Capacity, Stock
+from products import stock
+from products.stock import OutOfStock
 from categories.models import Category
-from orders.models import Order, OrderItem
+from orders.checkout import place_order
+from orders.models import Order, OrderItem, Reservation
+from orders.sales import reconcile_total_sell
+from products.ranking import best_seller_ids
 
 
 User = get_user_model()
@@ -84,6 +98,87 @@ class OrderTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertRedirects(response, reverse("order-detail", kwargs={"pk": order.pk}))
 
+    def test_order_create_with_empty_cart(self):
+        self.cart_item.delete()
+        response = self.client.post(reverse("order-create"), {"full_name": "Test User"})
+        self.assertRedirects(response, reverse("cart"))
+        self.assertFalse(Order.objects.exists())
+
+    def test_order_create_snapshots_prices(self):
+        self.user.full_name = ""
+        self.user.save()
+        self.client.post(reverse("order-create"), {"full_name": "Buyer"})
+
+        item = OrderItem.objects.get()
+        self.assertEqual((item.org_price, item.final_price, item.total_discount), (200000, 180000, 20000))
+        order = Order.objects.get()
+        self.assertEqual((order.org_price, order.final_price, order.total_discount), (200000, 180000, 20000))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.full_name, "Buyer")
+
+    def test_double_submit_returns_same_order(self):
+        data = {"full_name": "Test User", "idempotency_key": "a" * 32}
+        first = self.client.post(reverse("order-create"), data)
+        second = self.client.post(reverse("order-create"), data)
+
+        order = Order.objects.get()
+        self.assertEqual(order.items.count(), 1)
+        self.assertEqual(first.url, second.url)
+        self.assertEqual(second.url, reverse("order-detail", kwargs={"pk": order.pk}))
+
+    def test_checkout_queries_do_not_grow_with_cart(self):
+        def checkout(size):
+            cart = Cart.objects.create(user=self.user) if size else self.cart
+            for i in range(size):
+                capacity = Capacity.objects.create(capacity=f"{i}GB", platform="PC", price=1000, discount=self.discount)
+                CartItem.objects.create(cart=cart, product=self.product, capacity=capacity)
+            with CaptureQueriesContext(connection) as queries:
+                place_order(self.user, Order(full_name="Test User"))
+            return len(queries)
+
+        self.assertEqual(checkout(0), checkout(5))
+
+    def test_totals_follow_item_changes(self):
+        order = Order.objects.create(user=self.user)
+        stale = Order.objects.get(pk=order.pk)
+        item = OrderItem.objects.create(order=order, product=self.product, final_price=900, org_price=1000, total_discount=100)
+        OrderItem.objects.create(order=order, product=self.product, final_price=50, org_price=50, total_discount=0)
+        stale.status = Order.Status.Cancelled
+        stale.save()
+
+        order.refresh_from_db()
+        self.assertEqual((order.org_price, order.final_price, order.total_discount), (1050, 950, 100))
+        item.delete()
+        order.refresh_from_db()
+        self.assertEqual(order.final_price, 50)
+
+    def test_order_pages_queries_do_not_grow_with_items(self):
+        order = Order.objects.create(user=self.user)
+        url = reverse("order-detail", kwargs={"pk": order.pk})
+
+        def count():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            return len(queries)
+
+        OrderItem.objects.create(order=order, product=self.product, capacity=self.capacity, final_price=1, org_price=1, total_discount=0)
+        # ساخت دسته‌بندی در setUp کش منو را باطل کرده است
+        count()
+        one = count()
+        for _ in range(5):
+            OrderItem.objects.create(order=order, product=self.product, capacity=self.capacity, final_price=1, org_price=1, total_discount=0)
+        self.assertEqual(count(), one)
+
+    def test_dashboard_paginates_orders(self):
+        Order.objects.bulk_create(Order(user=self.user, final_price=i) for i in range(25))
+        response = self.client.get(reverse("dashboard"))
+        self.assertEqual(len(response.context["orders"]), 10)
+        self.assertEqual(response.context["orders"][0].final_price, 24)
+
+        response = self.client.get(reverse("dashboard"), {"page": 3})
+        self.assertEqual(len(response.context["orders"]), 5)
+        self.assertContains(response, "صفحه 3 از 3")
+
     def test_order_create_requires_login(self):
         self.client.logout()
         url = reverse("order-create")
@@ -120,3 +215,232 @@ class OrderTests(TestCase):
         url = reverse("order-failed", kwargs={"pk": order.pk})
         response = self.client.get(url)
         # self.assertRedirects(response, reverse("home"))
+
+
+class TotalSellTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(phone="09123456789", full_name="Test User", password="test123")
+        category = Category.objects.create(name="Test", slug="test", image="x.jpg")
+        self.products = [
+            Product.objects.create(
+                title=f"P{i}", slug=f"p{i}", description="desc", price=1000,
+                image="test.jpg", category=category,
+            )
+            for i in range(3)
+        ]
+        self.order = Order.objects.create(user=self.user)
+        for product, quantity in zip(self.products, (2, 5)):
+            OrderItem.objects.create(
+                order=self.order, product=product, quantity=quantity,
+                final_price=1000, org_price=1000, total_discount=0,
+            )
+
+    def total_sells(self):
+        return [p.total_sell for p in Product.objects.filter(pk__in=[p.pk for p in self.products]).order_by("pk")]
+
+    def test_paid_order_increments_once(self):
+        self.order.status = Order.Status.Paid
+        self.order.save()
+        self.order.save()
+        Order.objects.get(pk=self.order.pk).save()
+        self.assertEqual(self.total_sells(), [2, 5, 0])
+
+    def test_leaving_paid_takes_sales_back(self):
+        self.order.status = Order.Status.Paid
+        self.order.save()
+        self.order.status = Order.Status.Cancelled
+        self.order.save()
+        self.assertEqual(self.total_sells(), [0, 0, 0])
+
+    def test_reconcile(self):
+        Order.objects.filter(pk=self.order.pk).update(status=Order.Status.Paid)
+        Product.objects.filter(pk=self.products[2].pk).update(total_sell=7)
+        self.assertEqual(reconcile_total_sell(), 3)
+        self.assertEqual(self.total_sells(), [2, 5, 0])
+        self.assertEqual(reconcile_total_sell(), 0)
+        self.assertTrue(Order.objects.get(pk=self.order.pk).sales_counted)
+
+    def test_reconcile_fixes_only_drifted_products(self):
+        self.order.status = Order.Status.Paid
+        self.order.save()
+        Product.objects.filter(pk=self.products[2].pk).update(total_sell=7)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(reconcile_total_sell(batch_size=1), 1)
+        updates = [q["sql"] for q in queries if q["sql"].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.total_sells(), [2, 5, 0])
+
+    def test_ranking_refreshes_after_payment(self):
+        self.assertEqual(best_seller_ids()[0], self.products[2].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.status = Order.Status.Paid
+            self.order.save()
+        self.assertEqual(best_seller_ids()[:2], [self.products[1].pk, self.products[0].pk])
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="09123456789", full_name="Test User", password="test123")
+        self.client.force_login(self.user)
+        category = Category.objects.create(name="Test", slug="test", image="x.jpg")
+        self.product = Product.objects.create(
+            title="Test Product", slug="test-product", price=1000, image="test.jpg", category=category,
+        )
+        self.stock = Stock.objects.create(product=self.product, on_hand=3)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+
+    def checkout(self):
+        order, _ = place_order(self.user, Order(full_name="Test User"))
+        self.stock.refresh_from_db()
+        return order
+
+    def test_checkout_reserves_stock(self):
+        order = self.checkout()
+        self.assertEqual((self.stock.on_hand, self.stock.reserved), (3, 2))
+        reservation = order.reservations.get()
+        self.assertEqual(reservation.quantity, 2)
+        self.assertGreater(reservation.expires_at, timezone.now())
+
+    def test_short_stock_rolls_back_checkout(self):
+        Stock.objects.filter(pk=self.stock.pk).update(on_hand=1)
+        response = self.client.post(reverse("order-create"), {"full_name": "Test User"})
+        self.assertRedirects(response, reverse("cart"), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(CartItem.objects.exists())
+        with self.assertRaises(OutOfStock):
+            place_order(self.user, Order(full_name="Test User"))
+
+    def test_payment_commits_reservation(self):
+        order = self.checkout()
+        order.status = Order.Status.Paid
+        order.save()
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.on_hand, self.stock.reserved), (1, 0))
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_cancel_releases_reservation(self):
+        order = self.checkout()
+        order.status = Order.Status.Cancelled
+        order.save()
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.on_hand, self.stock.reserved), (3, 0))
+        # ذخیره‌ی دوباره چیزی را دو بار آزاد نمی‌کند
+        order.save()
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.reserved, 0)
+
+    def test_expired_reservations_are_released(self):
+        order = self.checkout()
+        order.reservations.update(expires_at=timezone.now() - timedelta(minutes=1))
+        out = StringIO()
+        call_command("release_expired_reservations", stdout=out)
+        self.assertIn("1 orders cancelled", out.getvalue())
+        order.refresh_from_db()
+        self.stock.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.Cancelled)
+        self.assertEqual(self.stock.reserved, 0)
+
+    def test_payment_commits_once(self):
+        order = self.checkout()
+        order.status = Order.Status.Paid
+        order.save()
+        Order.objects.get(pk=order.pk).save()
+        order.save()
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.on_hand, self.stock.reserved), (1, 0))
+
+    def test_late_payment_reserves_again(self):
+        order = self.checkout()
+        order.reservations.update(expires_at=timezone.now() - timedelta(minutes=1))
+        call_command("release_expired_reservations", stdout=StringIO())
+        order.status = Order.Status.Paid
+        order.save()
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.on_hand, self.stock.reserved), (1, 0))
+
+    def test_late_payment_without_stock_fails(self):
+        order = self.checkout()
+        order.reservations.update(expires_at=timezone.now() - timedelta(minutes=1))
+        call_command("release_expired_reservations", stdout=StringIO())
+        Stock.objects.filter(pk=self.stock.pk).update(on_hand=1)
+        order.status = Order.Status.Paid
+        with self.assertRaises(OutOfStock):
+            order.save()
+
+    def test_expiry_skips_orders_no_longer_waiting(self):
+        order = self.checkout()
+        order.reservations.update(expires_at=timezone.now() - timedelta(minutes=1))
+        # پرداخت بعد از خواندن شناسه‌ها؛ update سیگنال ندارد و رزرو باقی می‌ماند
+        Order.objects.filter(pk=order.pk).update(status=Order.Status.Paid)
+        out = StringIO()
+        call_command("release_expired_reservations", stdout=out)
+        self.assertIn("0 orders cancelled", out.getvalue())
+        order.refresh_from_db()
+        self.stock.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.Paid)
+        self.assertEqual(self.stock.reserved, 2)
+
+    def test_untracked_products_are_not_limited(self):
+        self.stock.delete()
+        order, _ = place_order(self.user, Order(full_name="Test User"))
+        self.assertFalse(order.reservations.exists())
+
+
+class StockRaceTests(TransactionTestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name="Test", slug="test", image="x.jpg")
+        self.product = Product.objects.create(
+            title="Test Product", slug="test-product", price=1000, image="test.jpg", category=category,
+        )
+        self.stock = Stock.objects.create(product=self.product, on_hand=1)
+        self.users = []
+        for i in range(8):
+            user = User.objects.create_user(phone=f"0912000000{i}", password="test123")
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=self.product)
+            self.users.append(user)
+
+    def test_last_unit_is_reserved_once(self):
+        def reserve(_):
+            try:
+                while True:
+                    try:
+                        return bool(stock.reserve({(self.product.pk, None): 1}))
+                    except OperationalError as error:
+                        # SQLite گاهی نوشتن هم‌زمان را با قفل جدول رد می‌کند؛ دوباره تلاش می‌شود
+                        if "locked" not in str(error):
+                            raise
+            except OutOfStock:
+                return False
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(reserve, range(8)))
+
+        self.assertEqual(results.count(True), 1)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.reserved, 1)
+
+    # SQLite قفل سطری ندارد و تراکنش‌های هم‌زمان را با خطای قفل جدول رد می‌کند
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_last_unit_is_sold_once(self):
+        def checkout(user):
+            try:
+                place_order(user, Order(full_name="Buyer"))
+                return True
+            except OutOfStock:
+                return False
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(checkout, self.users))
+
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.reserved, 1)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from django.contrib import admin
-from .models import Product, Capacity, Discount, ProductImages, ProductFeature
+from .models import Product, Capacity, Discount, ProductImages, ProductFeature, Stock
 
 
 class ImageInline(admin.TabularInline):
@@ -16,6 +16,13 @@ class FeaturedProductInline(admin.StackedInline):
     autocomplete_fields = ['product']
 
 
+class StockInline(admin.TabularInline):
+    model = Stock
+    extra = 0
+    fields = ("capacity", "on_hand", "reserved")
+    readonly_fields = ("reserved",)
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ("title", "category", "id")
@@ -25,7 +32,7 @@ class ProductAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("title",)}
     ordering = ("-created_at",)
 
-    inlines = [ImageInline, FeaturedProductInline]
+    inlines = [ImageInline, FeaturedProductInline, StockInline]
 
 admin.site.register(Capacity)
 admin.site.register(Discount)
\ No newline at end of file
@@ -0,0 +1,287 @@
+import csv
+import json
+from collections import Counter, namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Prefetch
+
+from categories.models import Category
+from . import facets, home, ranking
+from .models import Capacity, Discount, Product, ProductFeature, ProductImages, ProductSearchTerm, apply_discount
+from .search import build_entries, defer_indexing
+
+FORMATS = ("csv", "jsonl")
+PRODUCT_FIELDS = (
+    "slug", "title", "type", "category", "price", "discount",
+    "description", "image", "status", "is_active",
+)
+# در CSV این ستون‌ها به صورت JSON نوشته می‌شوند
+NESTED_FIELDS = ("capacities", "features", "images")
+COLUMNS = PRODUCT_FIELDS + NESTED_FIELDS
+UPDATE_FIELDS = [
+    "title", "type", "category", "price", "discount", "sale_price",
+    "description", "image", "status", "is_active", "updated_at",
+]
+MAX_ERRORS = 100
+
+Row = namedtuple("Row", "product discount capacities features images")
+
+
+class Rollback(Exception):
+    pass
+
+
+def upsert_options():
+    """
+    ``bulk_create`` arguments for the slug upsert. MySQL's ON DUPLICATE KEY
+    UPDATE cannot name a conflict target (Django refuses ``unique_fields``
+    there); it already fires on the unique slug index.
+    """
+    options = {"update_conflicts": True, "update_fields": UPDATE_FIELDS}
+    if connection.features.supports_update_conflicts_with_target:
+        options["unique_fields"] = ["slug"]
+    return options
+
+
+def detect_format(path):
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def read_records(file, fmt):
+    """Yield catalog records from an open text file one at a time."""
+    if fmt == "csv":
+        for row in csv.DictReader(file):
+            for field in NESTED_FIELDS:
+                row[field] = json.loads(row.get(field) or "[]")
+            yield row
+    else:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_records(records, file, fmt):
+    """Stream ``records`` to ``file``; returns the number of rows written."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+        for record in records:
+            for field in NESTED_FIELDS:
+                record[field] = json.dumps(record[field], ensure_ascii=False)
+            writer.writerow(record)
+            count += 1
+    else:
+        for record in records:
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def _discount_value(discount):
+    return discount.value if discount else None
+
+
+def export_records(chunk_size=2000):
+    products = (
+        Product.objects
+        .select_related("category", "discount")
+        .prefetch_related(
+            "features",
+            "images",
+            Prefetch("capacity", queryset=Capacity.objects.select_related("discount")),
+        )
+        .order_by("pk")
+    )
+    for product in products.iterator(chunk_size=chunk_size):
+        yield {
+            "slug": product.slug,
+            "title": product.title,
+            "type": product.type,
+            "category": product.category.slug,
+            "price": product.price,
+            "discount": _discount_value(product.discount),
+            "description": product.description,
+            "image": product.image.name,
+            "status": product.status,
+            "is_active": product.is_active,
+            "capacities": [
+                {
+                    "capacity": capacity.capacity,
+                    "platform": capacity.platform,
+                    "price": capacity.price,
+                    "discount": _discount_value(capacity.discount),
+                }
+                for capacity in product.capacity.all()
+            ],
+            "features": [{"key": feature.key, "value": feature.value} for feature in product.features.all()],
+            "images": [image.image.name for image in product.images.all()],
+        }
+
+
+def _int(value):
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+
+class CatalogImporter:
+    """
+    Upsert products (matched by slug) with their capacities, features, images
+    and discounts in batches: a few bulk queries per batch no matter its size,
+    and only one batch in memory at a time.
+    """
+
+    def __init__(self, batch_size=1000, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.stats = Counter()
+        self.errors = []
+        self.categories = dict(Category.objects.values_list("slug", "pk"))
+        self.discounts = {}
+        self.capacities = {}
+
+    def run(self, records):
+        batch = {}
+        for line, record in enumerate(records, start=1):
+            try:
+                row = self.parse(record)
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                self.error(line, e)
+                continue
+            if row.product.slug in batch:
+                self.stats["duplicates"] += 1
+            batch[row.product.slug] = row
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = {}
+        if batch:
+            self.flush(batch)
+
+        if not self.dry_run and (self.stats["created"] or self.stats["updated"]):
+            facets.bump_version()
+            ranking.bump_version()
+            home.bump_version("products", "best_sellers")
+        return self.stats
+
+    def error(self, line, exception):
+        self.stats["errors"] += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, f"{type(exception).__name__}: {exception}"))
+
+    def parse(self, record):
+        slug = record["slug"].strip()
+        if not slug:
+            raise ValueError("empty slug")
+        category = record["category"]
+        if category not in self.categories:
+            raise ValueError(f"unknown category {category!r}")
+
+        discount = _int(record.get("discount"))
+        product = Product(
+            slug=slug,
+            title=record["title"],
+            type=record.get("type") or Product.Type.ACCOUNT,
+            category_id=self.categories[category],
+            price=int(record["price"]),
+            description=record.get("description") or "",
+            image=record.get("image") or "",
+            status=record.get("status") or Product.STATUS.available,
+            is_active=_bool(record.get("is_active", True)),
+        )
+        if product.type not in Product.Type.values:
+            raise ValueError(f"unknown type {product.type!r}")
+        if product.status not in Product.STATUS.values:
+            raise ValueError(f"unknown status {product.status!r}")
+        # bulk_create متد save را صدا نمی‌زند
+        product.sale_price = product.price if discount is None else apply_discount(product.price, discount)
+
+        capacities = [
+            (item["capacity"], item["platform"], int(item["price"]), _int(item.get("discount")))
+            for item in record.get("capacities") or []
+        ]
+        features = [(item["key"], item["value"]) for item in record.get("features") or []]
+        images = [name for name in record.get("images") or [] if name]
+        return Row(product, discount, capacities, features, images)
+
+    def discount_id(self, value):
+        if value is None:
+            return None
+        if value not in self.discounts:
+            discount = Discount.objects.filter(value=value).order_by("pk").first()
+            if discount is None:
+                discount = Discount.objects.create(value=value)
+            self.discounts[value] = discount.pk
+        return self.discounts[value]
+
+    def capacity_id(self, capacity, platform, price, discount):
+        key = (capacity, platform, price, self.discount_id(discount))
+        if key not in self.capacities:
+            pk = (
+                Capacity.objects
+                .filter(capacity=capacity, platform=platform, price=price, discount_id=key[3])
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if pk is None:
+                instance = Capacity(capacity=capacity, platform=platform, price=price, discount_id=key[3])
+                instance.save()
+                pk = instance.pk
+            self.capacities[key] = pk
+        return self.capacities[key]
+
+    def flush(self, batch):
+        try:
+            with transaction.atomic(), defer_indexing():
+                stats = self.write(batch)
+                if self.dry_run:
+                    raise Rollback
+        except Rollback:
+            # شناسه‌های ساخته‌شده در این دسته برگشت خورده‌اند
+            self.discounts.clear()
+            self.capacities.clear()
+        self.stats.update(stats)
+
+    def write(self, batch):
+        existing = set(Product.objects.filter(slug__in=batch).values_list("slug", flat=True))
+        products = []
+        for row in batch.values():
+            row.product.discount_id = self.discount_id(row.discount)
+            products.append(row.product)
+
+        # یک INSERT ... ON CONFLICT(slug) DO UPDATE (در MySQL: ON DUPLICATE KEY UPDATE) برای کل دسته
+        Product.objects.bulk_create(products, **upsert_options())
+        # MySQL شناسه‌ها را برنمی‌گرداند و ردیف‌های به‌روزشده در هیچ دیتابیسی شناسه ندارند
+        ids = dict(Product.objects.filter(slug__in=batch).values_list("slug", "pk"))
+        for product in products:
+            product.pk = ids[product.slug]
+
+        product_ids = [row.product.pk for row in batch.values()]
+        Through = Product.capacity.through
+        if existing:
+            ProductFeature.objects.filter(product_id__in=product_ids).delete()
+            ProductImages.objects.filter(product_id__in=product_ids).delete()
+            Through.objects.filter(product_id__in=product_ids).delete()
+            ProductSearchTerm.objects.filter(product_id__in=product_ids).delete()
+
+        features, images, links, terms = [], [], [], []
+        for row in batch.values():
+            product = row.product
+            product_features = [ProductFeature(product_id=product.pk, key=k, value=v) for k, v in row.features]
+            features.extend(product_features)
+            images.extend(ProductImages(product_id=product.pk, image=name) for name in row.images)
+            capacity_ids = {self.capacity_id(*capacity) for capacity in row.capacities}
+            links.extend(Through(product_id=product.pk, capacity_id=pk) for pk in capacity_ids)
+            terms.extend(build_entries(product, product_features))
+
+        ProductFeature.objects.bulk_create(features, batch_size=self.batch_size)
+        ProductImages.objects.bulk_create(images, batch_size=self.batch_size)
+        Through.objects.bulk_create(links, batch_size=self.batch_size)
+        ProductSearchTerm.objects.bulk_create(terms, batch_size=self.batch_size)
+        return Counter(created=len(batch) - len(existing), updated=len(existing))
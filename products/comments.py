@@ -0,0 +1,34 @@
+from django.db.models import Count, Q
+
+from .models import Comment, Product
+
+COMMENTS_PER_PAGE = 10
+
+
+def refresh_comment_stats(product_id):
+    """Recount the approved / recommended comments stored on the product."""
+    stats = (
+        Comment.objects
+        .filter(product_id=product_id, status=Comment.STATUS.approved)
+        .aggregate(approved=Count('id'), recommended=Count('id', filter=Q(recommend=True)))
+    )
+    Product.objects.filter(pk=product_id).update(
+        approved_comments=stats['approved'],
+        recommended_comments=stats['recommended'],
+    )
+
+
+def approved_comments_page(product_slug, page=1):
+    """
+    One page of approved comments, newest first, in a single query (one extra
+    row tells whether another page exists). Returns ``(comments, next_page)``.
+    """
+    offset = (page - 1) * COMMENTS_PER_PAGE
+    comments = list(
+        Comment.objects
+        .filter(product__slug=product_slug, status=Comment.STATUS.approved)
+        .select_related('user')
+        .order_by('-created_at', '-id')[offset:offset + COMMENTS_PER_PAGE + 1]
+    )
+    next_page = page + 1 if len(comments) > COMMENTS_PER_PAGE else None
+    return comments[:COMMENTS_PER_PAGE], next_page
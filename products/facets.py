@@ -0,0 +1,112 @@
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, IntegerField, Value, When
+
+from core.caching import cached_value, version_timeout
+from .models import Product
+
+FACETS_TIMEOUT = 600
+VERSION_KEY = "product_facets_version"
+
+# بازه‌های قیمت (تومان)؛ سقف None یعنی بدون محدودیت
+PRICE_BUCKETS = [
+    (0, 500_000, "تا ۵۰۰ هزار"),
+    (500_000, 1_000_000, "۵۰۰ هزار تا ۱ میلیون"),
+    (1_000_000, 3_000_000, "۱ تا ۳ میلیون"),
+    (3_000_000, None, "بیش از ۳ میلیون"),
+]
+
+
+def bump_version():
+    cache.set(VERSION_KEY, time.time_ns(), version_timeout())
+
+
+def _bucket_expression():
+    whens = [
+        When(sale_price__lt=upper, then=Value(index))
+        for index, (_, upper, _) in enumerate(PRICE_BUCKETS)
+        if upper is not None
+    ]
+    return Case(*whens, default=Value(len(PRICE_BUCKETS) - 1), output_field=IntegerField())
+
+
+def _rows(queryset):
+    """Product counts grouped by every facet dimension in one GROUP BY query."""
+    return list(
+        queryset
+        .order_by()
+        .annotate(
+            price_bucket=_bucket_expression(),
+            special=Case(
+                When(discount__isnull=False, then=Value("1")),
+                default=Value(""),
+                output_field=CharField(),
+            ),
+        )
+        .values("category__slug", "category__name", "type", "price_bucket", "special")
+        .annotate(n=Count("id"))
+    )
+
+
+def _matches(row, selected, skip):
+    for name, value in selected.items():
+        if name == skip or not value:
+            continue
+        if name == "category" and row["category__slug"] != value:
+            return False
+        if name == "type" and row["type"] != value:
+            return False
+        if name == "special" and not row["special"]:
+            return False
+    return True
+
+
+def compute_facets(rows, selected):
+    """
+    Facet counts from the grouped rows. Each facet ignores its own selection
+    (so the other options stay visible) but applies every other one.
+    """
+    categories, names, types, buckets = Counter(), {}, Counter(), Counter()
+    special = 0
+    for row in rows:
+        if _matches(row, selected, "category"):
+            categories[row["category__slug"]] += row["n"]
+            names[row["category__slug"]] = row["category__name"]
+        if _matches(row, selected, "type"):
+            types[row["type"]] += row["n"]
+        if _matches(row, selected, None):
+            buckets[row["price_bucket"]] += row["n"]
+        if row["special"] and _matches(row, selected, "special"):
+            special += row["n"]
+
+    return {
+        "categories": [
+            {"slug": slug, "name": names[slug], "count": count}
+            for slug, count in categories.most_common()
+        ],
+        "types": [
+            {"value": value, "label": label, "count": types[value]}
+            for value, label in Product.Type.choices
+            if types[value]
+        ],
+        "prices": [
+            # فیلتر لیست سقف را شامل می‌شود (lte)؛ بازه‌ها نیم‌باز هستند
+            {"min": lower, "max": upper - 1 if upper is not None else None, "label": label, "count": buckets[index]}
+            for index, (lower, upper, label) in enumerate(PRICE_BUCKETS)
+            if buckets[index]
+        ],
+        "special": special,
+    }
+
+
+def get_facets(queryset, selected, signature):
+    """
+    Cached facets for ``queryset`` (filtered by everything except the facet
+    selections in ``selected``). A miss costs a single aggregate query; product
+    changes bump the version so stale counts are never served.
+    """
+    version = cache.get_or_set(VERSION_KEY, time.time_ns, version_timeout())
+    key = f"product_facets:{version}:{signature}"
+    return cached_value(key, lambda: compute_facets(_rows(queryset), selected), FACETS_TIMEOUT)
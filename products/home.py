@@ -0,0 +1,108 @@
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from categories.models import Category
+from core.caching import single_flight, stats, version_timeout
+from core.models import Banner
+from .models import Product
+from .ranking import best_sellers
+
+SNAPSHOT_KEY = "home_snapshot"
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
+def _products():
+    products = Product.objects.select_related("discount")
+    return {
+        "newest_products": list(products.order_by("-created_at")[:15]),
+        "discounted_products": list(products.filter(discount__isnull=False)[:15]),
+        "physical_products": list(products.filter(type=Product.Type.PHYSICAL)[:15]),
+        "gift_cards": list(products.filter(type=Product.Type.GIFT_CARD)[:15]),
+    }
+
+
+def _best_sellers():
+    return {"best_sellers": best_sellers(limit=15)}
+
+
+def _banners():
+    # بنرهای زمان‌بندی‌شده‌ی آینده هم نگه داشته می‌شوند؛ زمان در group_banners بررسی می‌شود
+    return {"banners": list(Banner.objects.scheduled())}
+
+
+def group_banners(banners, now=None):
+    """``slider_banners``/``side_banners``/``middle_banners`` of the banners live at ``now``."""
+    now = now or timezone.now()
+    groups = {placement: [] for placement in Banner.Placement}
+    for banner in banners:
+        group = groups[banner.placement]
+        if len(group) < Banner.LIMITS[banner.placement] and banner.is_live(now):
+            group.append(banner)
+    return {f"{placement}_banners": group for placement, group in groups.items()}
+
+
+def _categories():
+    return {"categories": list(Category.objects.all()[:6])}
+
+
+# هر گروه نسخه جدا دارد تا تغییر یک بنر محصولات را دوباره نسازد
+SECTIONS = {
+    "products": _products,
+    "best_sellers": _best_sellers,
+    "banners": _banners,
+    "categories": _categories,
+}
+
+
+def version_key(section):
+    return f"home_version:{section}"
+
+
+def bump_version(*sections):
+    cache.set_many({version_key(section): time.time_ns() for section in sections}, version_timeout(SNAPSHOT_TIMEOUT))
+
+
+def get_home_snapshot():
+    """
+    Context for the home page from one ``get_many``: the snapshot plus the
+    version stamp of every section. Sections whose stamp moved (or expired)
+    are rebuilt in the same pass and written back with one ``set_many`` by a
+    single worker; the others keep serving the previous snapshot meanwhile.
+    """
+    cached = cache.get_many([SNAPSHOT_KEY, *map(version_key, SECTIONS)])
+    snapshot = cached.get(SNAPSHOT_KEY) or {"versions": {}, "sections": {}}
+
+    updates = {}
+    stale = []
+    for section in SECTIONS:
+        version = cached.get(version_key(section))
+        if version is None:
+            version = updates[version_key(section)] = time.time_ns()
+        if snapshot["versions"].get(section) != version:
+            stale.append((section, version))
+
+    if stale:
+        with single_flight(SNAPSHOT_KEY) as leader:
+            # بقیه workerها تا پایان بازسازی همان نسخه قبلی را می‌بینند
+            if not leader and all(section in snapshot["sections"] for section in SECTIONS):
+                stats.record("stale")
+                stale, updates = [], {}
+            else:
+                stats.record("refresh" if snapshot["sections"] else "miss")
+            for section, version in stale:
+                snapshot["sections"][section] = SECTIONS[section]()
+                snapshot["versions"][section] = version
+                updates[SNAPSHOT_KEY] = snapshot
+            if updates:
+                # با LocMem هر worker فقط bump خودش را می‌بیند؛ عمر کوتاه بقیه را هم به‌روز می‌کند
+                cache.set_many(updates, version_timeout(SNAPSHOT_TIMEOUT))
+    else:
+        stats.record("hit")
+
+    context = {}
+    for section in SECTIONS:
+        context.update(snapshot["sections"][section])
+    context.update(group_banners(context.pop("banners")))
+    return context
@@ -0,0 +1,77 @@
+import random
+import time
+from itertools import accumulate
+
+from categories.models import Category
+from products.models import Product, ProductFeature
+
+# کاتالوگ مصنوعی برای بنچمارک‌ها
+WORDS = [
+    "پلی", "استیشن", "اکانت", "ظرفیت", "گیفت", "کارت", "دسته", "بازی", "فیفا", "کالاف",
+    "دیوتی", "اسپایدرمن", "گاد", "آف", "وار", "ریسینگ", "فوتبال", "ماجراجویی", "اکشن", "ترسناک",
+    "playstation", "ps5", "ps4", "fifa", "gta", "elden", "ring", "horizon", "forza", "nba",
+]
+LETTERS = "ابپتجچخدرزسشفقکگلمنوهی"
+
+
+def vocabulary(rng, size=20_000):
+    return WORDS + ["".join(rng.choice(LETTERS) for _ in range(rng.randint(3, 8))) for _ in range(size)]
+
+
+def sentence(rng, words, length):
+    # توزیع زیپف‌گونه: چند واژه پرتکرار و دنباله‌ای از واژه‌های کمیاب
+    weights = list(accumulate(1 / (rank + 50) for rank in range(len(words))))
+    return " ".join(rng.choices(words, cum_weights=weights, k=length))
+
+
+def seed_catalog(size, batch_size=2000, seed=0):
+    """bulk_create ``size`` synthetic products (signals are not fired)."""
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    rng.shuffle(words)
+    categories = [
+        Category.objects.create(name=f"bench-{i}", slug=f"bench-{i}", image="x.jpg")
+        for i in range(10)
+    ]
+    types = [choice for choice, _ in Product.Type.choices]
+
+    products = []
+    for i in range(size):
+        products.append(Product(
+            title=f"{sentence(rng, words, 4)} {i}",
+            slug=f"bench-{i}",
+            image="x.jpg",
+            description=sentence(rng, words, 60),
+            price=rng.randint(10, 5000) * 1000,
+            category=rng.choice(categories),
+            type=rng.choice(types),
+            total_sell=rng.randint(0, 1000),
+        ))
+        if len(products) >= batch_size:
+            Product.objects.bulk_create(products)
+            products = []
+    Product.objects.bulk_create(products)
+
+    features = []
+    for product_id in Product.objects.filter(slug__startswith="bench-").values_list("pk", flat=True).iterator():
+        features.append(ProductFeature(product_id=product_id, key="پلتفرم", value=rng.choice(["PS4", "PS5"])))
+        if len(features) >= batch_size:
+            ProductFeature.objects.bulk_create(features)
+            features = []
+    ProductFeature.objects.bulk_create(features)
+    return categories
+
+
+def measure(func, repeat):
+    """Run ``func`` ``repeat`` times; returns (p50, p99) in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+class Rollback(Exception):
+    pass
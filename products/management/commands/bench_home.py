@@ -0,0 +1,95 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from categories.models import Category
+from core.models import Banner
+from products.home import get_home_snapshot
+from products.models import Product
+
+from ._bench import Rollback, seed_catalog
+
+
+def legacy_home_context():
+    # همان الگوی قبلی home_view: هشت کلید با get/set جدا
+    sections = {
+        "home_newest_products": (lambda: list(Product.objects.newest().select_related("discount")[:15]), 300),
+        "home_discounted_products": (lambda: list(Product.objects.discounted().select_related("discount")[:15]), 300),
+        "home_physical_products": (lambda: list(Product.objects.filter(type=Product.Type.PHYSICAL).select_related("discount")[:15]), 300),
+        "home_gift_cards": (lambda: list(Product.objects.filter(type=Product.Type.GIFT_CARD).select_related("discount")[:15]), 300),
+        "home_slider_banners": (lambda: list(Banner.objects.filter(placement=Banner.Placement.SLIDER)[:5]), 3600),
+        "home_side_banners": (lambda: list(Banner.objects.filter(placement=Banner.Placement.SIDE)[:2]), 3600),
+        "home_middle_banners": (lambda: list(Banner.objects.filter(placement=Banner.Placement.MIDDLE)[:2]), 3600),
+        "home_categories": (lambda: list(Category.objects.all()[:6]), 600),
+    }
+    context = {}
+    for key, (build, timeout) in sections.items():
+        value = cache.get(key)
+        if value is None:
+            value = build()
+            cache.set(key, value, timeout)
+        context[key] = value
+    return context
+
+
+class CacheCalls:
+    """Counts calls to the cache methods that hit the backend."""
+
+    METHODS = ("get", "set", "get_many", "set_many", "add", "delete")
+
+    def __enter__(self):
+        self.calls = 0
+        self.inside = 0
+        self.originals = {name: getattr(cache, name) for name in self.METHODS}
+        for name, original in self.originals.items():
+            setattr(cache, name, self.wrap(original))
+        return self
+
+    def wrap(self, original):
+        def counted(*args, **kwargs):
+            if not self.inside:
+                self.calls += 1
+            self.inside += 1
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.inside -= 1
+        return counted
+
+    def __exit__(self, *exc):
+        for name in self.originals:
+            delattr(cache, name)
+
+
+class Command(BaseCommand):
+    help = "Compare the legacy home-page cache pattern with the versioned snapshot (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=2_000)
+        parser.add_argument("--requests", type=int, default=2_000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                seed_catalog(options["products"])
+                for name, build in (("legacy", legacy_home_context), ("snapshot", get_home_snapshot)):
+                    self.run(name, build, options["requests"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, name, build, requests):
+        cache.clear()
+        with CacheCalls() as cold:
+            build()
+        with CacheCalls() as warm:
+            started = time.perf_counter()
+            for _ in range(requests):
+                build()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{name:<10} cold: {cold.calls} cache calls | warm: {warm.calls / requests:.0f} cache calls/request, "
+            f"{requests / elapsed:,.0f} req/s"
+        )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from products.models import Product
+from products.pagination import CursorPaginator, SORT_ORDERINGS
+
+from ._bench import Rollback, measure, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Compare OFFSET and cursor pagination latency by page depth on a synthetic catalog (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20_000)
+        parser.add_argument("--sort", default="cheapest", choices=SORT_ORDERINGS)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.stdout.write(f"Seeding {options['products']} products...")
+                seed_catalog(options["products"])
+                self.run(options["sort"], options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, sort, repeat):
+        ordering = SORT_ORDERINGS[sort]
+        queryset = Product.objects.active().order_by(*ordering)
+        per_page = 30
+        last_page = Paginator(queryset, per_page).num_pages
+
+        self.stdout.write(f"{'page':>6}{'offset p50/p99':>22}{'cursor p50/p99':>22}")
+        for number in (1, 10, 100, 500, last_page):
+            if number > last_page:
+                continue
+            cursor_paginator = CursorPaginator(queryset, per_page, ordering, count_key="bench_pagination_count")
+            cursor = None
+            if number > 1:
+                # کرسر صفحه n از آخرین ردیف صفحه n-1 ساخته می‌شود
+                boundary = queryset[(number - 1) * per_page - 1]
+                cursor = cursor_paginator.encode(boundary)
+
+            # Paginator جدید در هر اجرا، مثل هر درخواست ListView، COUNT را هم اجرا می‌کند
+            offset = measure(lambda: list(Paginator(queryset, per_page).page(number)), repeat)
+            keyset = measure(lambda: list(cursor_paginator.page(cursor)), repeat)
+            self.stdout.write(f"{number:>6}{offset[0]:>10.1f}/{offset[1]:<8.1f}ms{keyset[0]:>10.1f}/{keyset[1]:<8.1f}ms")
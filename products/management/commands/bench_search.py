@@ -0,0 +1,54 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from products.models import Product
+from products.search import rebuild_index, search_products, order_by_relevance
+
+from ._bench import Rollback, measure, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Compare the search index with the icontains search on a synthetic catalog (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=8)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.stdout.write(f"Seeding {options['products']} products...")
+                seed_catalog(options["products"])
+                rebuild_index()
+                self.run(options["queries"], options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, queries, repeat):
+        rng = random.Random(1)
+        titles = list(Product.objects.values_list("title", flat=True)[:1000])
+        base = Product.objects.active()
+
+        # هر دو مسیر مثل ProductListView: COUNT برای صفحه‌بندی + صفحه اول
+        def legacy(query):
+            qs = base.filter(Q(title__icontains=query) | Q(description__icontains=query))
+            return qs.count(), list(qs[:30])
+
+        def indexed(query):
+            qs = search_products(base, query)
+            return qs.count(), list(order_by_relevance(qs)[:30])
+
+        self.stdout.write(f"{'query':<28}{'hits':>8}{'icontains p50/p99':>22}{'index p50/p99':>22}")
+        for _ in range(queries):
+            query = " ".join(rng.choice(titles).split()[:rng.randint(1, 2)])
+            hits = indexed(query)[0]
+            old = measure(lambda: legacy(query), repeat)
+            new = measure(lambda: indexed(query), repeat)
+            self.stdout.write(
+                f"{query:<28}{hits:>8}{old[0]:>10.1f}/{old[1]:<8.1f}ms{new[0]:>10.1f}/{new[1]:<8.1f}ms"
+            )
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.catalog import FORMATS, detect_format, export_records, write_records
+
+
+class Command(BaseCommand):
+    help = "Stream every product with its capacities, features and images to CSV/JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="Output file, or - for stdout")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or detect_format(path)
+
+        started = time.perf_counter()
+        records = export_records(chunk_size=options["chunk_size"])
+        if path == "-":
+            write_records(records, self.stdout, fmt)
+            return
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            count = write_records(records, file, fmt)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {count} products exported in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} rows/s)"
+        ))
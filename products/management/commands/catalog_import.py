@@ -0,0 +1,42 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog import FORMATS, CatalogImporter, detect_format, read_records
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV/JSONL catalog into products (upsert by slug) with bulk queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file, or - for stdin")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Validate and write everything, then roll back")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or detect_format(path)
+        importer = CatalogImporter(batch_size=options["batch_size"], dry_run=options["dry_run"])
+
+        started = time.perf_counter()
+        try:
+            file = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+        except OSError as e:
+            raise CommandError(e)
+        with file:
+            try:
+                stats = importer.run(read_records(file, fmt))
+            except ValueError as e:
+                raise CommandError(f"invalid {fmt} input: {e}")
+        elapsed = time.perf_counter() - started
+
+        for line, message in importer.errors:
+            self.stderr.write(f"row {line}: {message}")
+        rows = stats["created"] + stats["updated"]
+        prefix = "🔍 dry run: " if options["dry_run"] else "✅ "
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{stats['created']} created, {stats['updated']} updated, "
+            f"{stats['errors']} errors in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)"
+        ))
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_index(apps, schema_editor):
+    from products.search import product_terms
+
+    Product = apps.get_model('products', 'Product')
+    ProductSearchTerm = apps.get_model('products', 'ProductSearchTerm')
+
+    entries = []
+    for product in Product.objects.prefetch_related('features').iterator(chunk_size=1000):
+        entries.extend(
+            ProductSearchTerm(product_id=product.pk, term=term, weight=weight)
+            for term, weight in product_terms(product, product.features.all()).items()
+        )
+        if len(entries) >= 1000:
+            ProductSearchTerm.objects.bulk_create(entries)
+            entries = []
+    ProductSearchTerm.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'product'], name='search_term_product_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'term'), name='unique_product_search_term')],
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:26
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    from products.models import discounted_price_expression
+
+    Discount = apps.get_model('products', 'Discount')
+    for model_name in ('Product', 'Capacity'):
+        model = apps.get_model('products', model_name)
+        model.objects.filter(discount__isnull=True).update(sale_price=models.F('price'))
+        for discount in Discount.objects.all():
+            model.objects.filter(discount=discount).update(sale_price=discounted_price_expression(discount.value))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_search_term'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='capacity',
+            name='sale_price',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sale_price',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:39
+
+import core.images
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_sale_price'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(upload_to=core.images.ContentHashedUpload('products/')),
+        ),
+        migrations.AlterField(
+            model_name='productimages',
+            name='image',
+            field=models.ImageField(upload_to=core.images.ContentHashedUpload('products/')),
+        ),
+    ]
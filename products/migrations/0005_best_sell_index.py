@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0002_content_hashed_uploads'),
+        ('products', '0004_content_hashed_uploads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-total_sell', '-id'], name='product_best_sell_idx'),
+        ),
+    ]
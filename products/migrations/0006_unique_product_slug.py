@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+
+def deduplicate_slugs(apps, schema_editor):
+    # قبل از unique شدن، اسلاگ‌های تکراری (به جز قدیمی‌ترین) شناسه می‌گیرند
+    Product = apps.get_model('products', 'Product')
+    duplicates = (
+        Product.objects
+        .values('slug')
+        .annotate(n=models.Count('id'))
+        .filter(n__gt=1)
+        .values_list('slug', flat=True)
+    )
+    for slug in list(duplicates):
+        for product in Product.objects.filter(slug=slug).order_by('id')[1:]:
+            Product.objects.filter(pk=product.pk).update(slug=f'{slug}-{product.pk}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_best_sell_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='slug',
+            field=models.SlugField(allow_unicode=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    Comment = apps.get_model('products', 'Comment')
+    Product = apps.get_model('products', 'Product')
+    stats = (
+        Comment.objects
+        .filter(status='A')
+        .values('product')
+        .annotate(
+            approved=models.Count('id'),
+            recommended=models.Count('id', filter=models.Q(recommend=True)),
+        )
+    )
+    for row in stats:
+        Product.objects.filter(pk=row['product']).update(
+            approved_comments=row['approved'],
+            recommended_comments=row['recommended'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_unique_product_slug'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='approved_comments',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='recommended_comments',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['product', 'status', '-created_at'], name='comment_product_status_idx'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
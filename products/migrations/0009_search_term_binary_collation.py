@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def set_binary_collation(apps, schema_editor):
+    # collation پیش‌فرض MySQL 8 حساس به اعراب نیست و pokémon و pokemon را یکی می‌داند؛
+    # normalize در پایتون آن‌ها را جدا نگه می‌دارد و قید یکتایی (product, term) می‌شکند
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE products_productsearchterm '
+        'MODIFY term varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL'
+    )
+
+
+def reset_collation(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute('ALTER TABLE products_productsearchterm MODIFY term varchar(64) NOT NULL')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_binary_collation, reset_collation),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_search_term_binary_collation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='total_sell',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,7 +1,20 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Coalesce, Floor, Greatest
 from django.shortcuts import reverse
 from categories.models import Category
+from core.images import ContentHashedUpload
+from core.models import ManagedFieldsMixin
+
+
+def apply_discount(price, discount_value):
+    return max(price * (100 - discount_value) // 100, 0)
+
+
+def discounted_price_expression(discount_value, price=models.F('price')):
+    """SQL equivalent of ``apply_discount`` for bulk updates."""
+    return Greatest(Floor(price * (100 - discount_value) / 100.0), 0)
 
 
 class ProductManager(models.Manager):
@@ -15,10 +28,10 @@ class ProductManager(models.Manager):
         return self.get_queryset().filter(discount__isnull=False)
 
     def cheapest(self):
-        return self.get_queryset().order_by("price")
+        return self.get_queryset().order_by("sale_price")
 
     def most_expensive(self):
-        return self.get_queryset().order_by("-price")
+        return self.get_queryset().order_by("-sale_price")
 
 
 class ProductFeature(models.Model):
@@ -32,19 +45,25 @@ class Capacity(models.Model):
     platform = models.CharField(max_length=200)
     price = models.IntegerField()
     discount = models.ForeignKey('Discount', on_delete=models.SET_NULL, null=True, blank=True)
+    # مقدار ذخیره‌شده final_price؛ با تغییر Discount به صورت گروهی به‌روز می‌شود
+    sale_price = models.IntegerField(default=0, db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        self.sale_price = self.final_price()
+        super().save(*args, **kwargs)
+
     def final_price(self):
         if not self.discount:
             return self.price
-        return max(self.price * (1 - self.discount.value / 100), 0)
+        return apply_discount(self.price, self.discount.value)
 
     def __str__(self):
         return f"{self.capacity} {self.platform} |{self.price} تومان"
 
 
-class Product(models.Model):
+class Product(ManagedFieldsMixin, models.Model):
     class STATUS(models.TextChoices):
         available = 'A', "Available"
         draft = 'D', "draft"
@@ -57,14 +76,20 @@ class Product(models.Model):
 
     type = models.CharField(choices=Type.choices, default=Type.ACCOUNT, max_length=100)
     title = models.CharField(max_length=100)
-    slug = models.SlugField(allow_unicode=True)
-    image = models.ImageField(upload_to='products/')
+    slug = models.SlugField(allow_unicode=True, unique=True)
+    image = models.ImageField(upload_to=ContentHashedUpload('products/'))
     description = models.TextField()
     capacity = models.ManyToManyField(Capacity, blank=True)
     price = models.IntegerField()
     discount = models.ForeignKey('Discount', on_delete=models.SET_NULL, null=True, blank=True)
+    # مقدار ذخیره‌شده get_final_price برای فیلتر و مرتب‌سازی در SQL
+    sale_price = models.IntegerField(default=0, db_index=True, editable=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
-    total_sell = models.IntegerField(default=0)
+    # فقط با F() در orders.sales به‌روزرسانی می‌شود
+    total_sell = models.IntegerField(default=0, editable=False)
+    # شمارش دیدگاه‌های تاییدشده؛ با تغییر وضعیت دیدگاه در products.comments به‌روز می‌شود
+    approved_comments = models.PositiveIntegerField(default=0, editable=False)
+    recommended_comments = models.PositiveIntegerField(default=0, editable=False)
     is_active = models.BooleanField(default=True)
     status = models.CharField(max_length=100, choices=STATUS.choices, default=STATUS.available)
 
@@ -73,13 +98,32 @@ class Product(models.Model):
 
     objects = ProductManager()
 
+    COUNTER_FIELDS = ('total_sell', 'approved_comments', 'recommended_comments')
+    # شمارنده‌ها با UPDATE جدا تغییر می‌کنند؛ save نباید مقدار کهنه را رویشان بنویسد
+    MANAGED_FIELDS = COUNTER_FIELDS
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total_sell', '-id'], name='product_best_sell_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.sale_price = self.get_final_price()
+        super().save(*args, **kwargs)
+
     def get_final_price(self):
         if not self.discount:
             return self.price
-        return max(self.price * (1 - self.discount.value / 100), 0)
+        return apply_discount(self.price, self.discount.value)
+
+    @property
+    def recommend_percent(self):
+        if not self.approved_comments:
+            return None
+        return round(100 * self.recommended_comments / self.approved_comments)
 
     def get_absolute_url(self):
         return reverse('product-detail', kwargs={'slug': self.slug})
@@ -94,7 +138,7 @@ class Discount(models.Model):
 
 class ProductImages(models.Model):
     product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='products/')
+    image = models.ImageField(upload_to=ContentHashedUpload('products/'))
 
 
 class Comment(models.Model):
@@ -110,5 +154,63 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=1, choices=STATUS.choices, default=STATUS.draft)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'status', '-created_at'], name='comment_product_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.full_name} | {self.status}"
+
+class ProductSearchTerm(models.Model):
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'term'], name='unique_product_search_term'),
+        ]
+        indexes = [
+            models.Index(fields=['term', 'product'], name='search_term_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} ({self.weight})"
+
+
+class Stock(ManagedFieldsMixin, models.Model):
+    """
+    Inventory of a product, or of one of its capacities; a product-level row
+    also covers the capacities without a row of their own. Products without a
+    row are not tracked (digital goods). ``reserved`` is held by unpaid
+    orders; see ``products.stock``.
+    """
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='stock')
+    capacity = models.ForeignKey(Capacity, on_delete=models.CASCADE, null=True, blank=True)
+    on_hand = models.PositiveIntegerField(default=0)
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # reserved فقط با UPDATEهای products.stock تغییر می‌کند
+    MANAGED_FIELDS = ('reserved',)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                'product', Coalesce('capacity', models.Value(0)),
+                name='stock_unique_line',
+            ),
+            models.CheckConstraint(condition=models.Q(reserved__lte=models.F('on_hand')), name='stock_reserved_lte_on_hand'),
+        ]
+
+    def clean(self):
+        if self.on_hand < self.reserved:
+            raise ValidationError({'on_hand': f"{self.reserved} عدد برای سفارش‌های پرداخت‌نشده رزرو شده است"})
+
+    @property
+    def available(self):
+        return self.on_hand - self.reserved
+
     def __str__(self):
-        return f"{self.user.full_name} | {self.status}"
\ No newline at end of file
+        return f"{self.product} {self.capacity or ''} | {self.available}/{self.on_hand}"
@@ -0,0 +1,142 @@
+import hashlib
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from core.caching import cached_value
+
+CURSOR_SALT = "products.cursor"
+COUNT_TIMEOUT = 300
+
+# ترتیب هر sort_query؛ id آخرین کلید است تا ترتیب یکتا باشد
+SORT_ORDERINGS = {
+    "newest": ("-created_at", "-id"),
+    "best-sell": ("-total_sell", "-id"),
+    "most-expensive": ("-sale_price", "-id"),
+    "cheapest": ("sale_price", "id"),
+    "discounted": ("-created_at", "-id"),
+}
+DEFAULT_ORDERING = SORT_ORDERINGS["newest"]
+
+
+def filter_signature(params):
+    """Canonical hash of the list filters, used in cache keys."""
+    signature = "&".join(f"{key}={params[key]}" for key in sorted(params))
+    return hashlib.md5(signature.encode()).hexdigest()
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over ``ordering``: each page filters on the sort key of
+    the previous page's boundary row instead of using OFFSET, so every page
+    costs the same. Cursors are signed so clients cannot forge them, and the
+    total count is cached under ``count_key`` instead of run on each page.
+    """
+
+    def __init__(self, queryset, per_page, ordering, count_key=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return self.queryset.count()
+        return cached_value(self.count_key, self.queryset.count, COUNT_TIMEOUT)
+
+    def encode(self, obj, backwards=False):
+        values = []
+        for name, _ in self.ordering:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        return signing.dumps([values, backwards], salt=CURSOR_SALT, compress=True)
+
+    def decode(self, cursor):
+        try:
+            values, backwards = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if len(values) != len(self.ordering):
+            return None
+        for index, (name, _) in enumerate(self.ordering):
+            if isinstance(self._field(name), models.DateTimeField):
+                values[index] = parse_datetime(values[index])
+        if None in values:
+            return None
+        return values, bool(backwards)
+
+    def _field(self, name):
+        try:
+            return self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # مقادیر annotate شده مثل search_rank
+            return None
+
+    def _after(self, values, backwards):
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            lookup = "lt" if descending != backwards else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        # شرط بازه روی کلید اول تا دیتابیس بتواند از ایندکس شروع کند
+        name, descending = self.ordering[0]
+        lookup = "lte" if descending != backwards else "gte"
+        return Q(**{f"{name}__{lookup}": values[0]}) & condition
+
+    def page(self, cursor):
+        position = self.decode(cursor) if cursor else None
+        backwards = bool(position and position[1])
+
+        ordering = [f"{'-' if descending != backwards else ''}{name}" for name, descending in self.ordering]
+        queryset = self.queryset.order_by(*ordering)
+        if position:
+            queryset = queryset.filter(self._after(position[0], backwards))
+
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+
+        if backwards:
+            items.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        return CursorPage(
+            items,
+            self,
+            next_cursor=self.encode(items[-1]) if has_next and items else None,
+            previous_cursor=self.encode(items[0], backwards=True) if has_previous and items else None,
+        )
@@ -0,0 +1,32 @@
+import time
+
+from django.core.cache import cache
+
+from core.caching import cached_value, version_timeout
+from .models import Product
+
+TOP_N = 50
+RANKING_TIMEOUT = 60 * 60
+VERSION_KEY = "best_sellers_version"
+
+
+def bump_version():
+    cache.set(VERSION_KEY, time.time_ns(), version_timeout())
+
+
+def best_seller_ids(category_id=None):
+    """Cached ids of the ``TOP_N`` best-selling active products (overall or per category)."""
+    def build():
+        queryset = Product.objects.active()
+        if category_id is not None:
+            queryset = queryset.filter(category_id=category_id)
+        return list(queryset.order_by("-total_sell", "-id").values_list("pk", flat=True)[:TOP_N])
+
+    version = cache.get_or_set(VERSION_KEY, time.time_ns, version_timeout())
+    return cached_value(f"best_sellers:{version}:{category_id or 'all'}", build, RANKING_TIMEOUT)
+
+
+def best_sellers(category_id=None, limit=TOP_N, exclude=None):
+    ids = [pk for pk in best_seller_ids(category_id) if pk != exclude][:limit]
+    products = Product.objects.select_related("discount").in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
@@ -0,0 +1,166 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+
+from .models import Product, ProductSearchTerm
+
+TITLE_WEIGHT = 3
+FEATURE_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+TERM_MAX_LENGTH = 64
+
+_deferred = ContextVar("search_indexing_deferred", default=False)
+
+# یکسان‌سازی حروف عربی/فارسی و ارقام
+_CHAR_MAP = str.maketrans({
+    "ي": "ی",
+    "ى": "ی",
+    "ك": "ک",
+    "ة": "ه",
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ؤ": "و",
+    "\u200c": "",  # ZWNJ (نیم‌فاصله)
+    "\u200f": "",  # RLM
+    "\u0640": "",  # کشیده
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # ارقام فارسی
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # ارقام عربی
+})
+_DIACRITICS = re.compile("[\u064b-\u065f\u0670]")
+_TOKEN = re.compile(r"\w+")
+
+
+def normalize(text):
+    text = _DIACRITICS.sub("", text or "")
+    return text.translate(_CHAR_MAP).lower()
+
+
+def tokenize(text):
+    return [token[:TERM_MAX_LENGTH] for token in _TOKEN.findall(normalize(text))]
+
+
+def product_terms(product, features=None):
+    """Weighted term counts for ``product`` (title > features > description)."""
+    if features is None:
+        features = product.features.all()
+
+    weights = Counter()
+    for term in tokenize(product.title):
+        weights[term] += TITLE_WEIGHT
+    for feature in features:
+        for term in tokenize(f"{feature.key} {feature.value}"):
+            weights[term] += FEATURE_WEIGHT
+    for term in tokenize(product.description):
+        weights[term] += DESCRIPTION_WEIGHT
+    return weights
+
+
+def build_entries(product, features=None):
+    return [
+        ProductSearchTerm(product_id=product.pk, term=term, weight=weight)
+        for term, weight in product_terms(product, features).items()
+    ]
+
+
+@contextmanager
+def defer_indexing():
+    """Skip signal-driven reindexing; the caller indexes what it changed itself."""
+    token = _deferred.set(True)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+
+
+def indexing_deferred():
+    return _deferred.get()
+
+
+def index_product(product):
+    with transaction.atomic():
+        ProductSearchTerm.objects.filter(product_id=product.pk).delete()
+        ProductSearchTerm.objects.bulk_create(build_entries(product))
+
+
+def prefix_q(prefix):
+    # SQLite با LIKE ... ESCAPE از ایندکس استفاده نمی‌کند؛ برای آن از بازه استفاده می‌کنیم
+    if connection.vendor == "mysql":
+        return Q(term__startswith=prefix)
+    return Q(term__gte=prefix, term__lt=prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def search_products(queryset, query):
+    """
+    Filter ``queryset`` to products containing every term of ``query``.
+
+    The last term is matched as a prefix so results show up while the user is
+    still typing. Matches are annotated with ``search_rank`` (summed weight of
+    the hit terms) for relevance ordering.
+    """
+    terms = tokenize(query)
+    if not terms:
+        # مرتب‌سازی بر اساس مرتبط بودن به search_rank نیاز دارد
+        return queryset.none().annotate(search_rank=Value(0, output_field=IntegerField()))
+
+    prefix = terms[-1]
+    exact = set(terms[:-1]) - {prefix}
+
+    prefix_match = prefix_q(prefix)
+    condition = prefix_match
+    hits = Max(Case(When(prefix_match, then=Value(1)), default=Value(0)))
+    if exact:
+        condition |= Q(term__in=exact)
+        hits += Count("term", distinct=True, filter=Q(term__in=exact))
+
+    matched_ids = (
+        ProductSearchTerm.objects
+        .filter(condition)
+        .values("product")
+        .annotate(hits=hits)
+        .filter(hits=len(exact) + 1)
+        .values("product")
+    )
+    rank = (
+        ProductSearchTerm.objects
+        .filter(condition, product=OuterRef("pk"))
+        .order_by()
+        .values("product")
+        .annotate(r=Sum("weight"))
+        .values("r")
+    )
+    return (
+        queryset
+        .filter(pk__in=matched_ids)
+        .annotate(search_rank=Subquery(rank, output_field=IntegerField()))
+    )
+
+
+RELEVANCE_ORDERING = ("-search_rank", "-id")
+
+
+def order_by_relevance(queryset):
+    return queryset.order_by(*RELEVANCE_ORDERING)
+
+
+def rebuild_index(batch_size=1000):
+    """Rebuild the whole index in batches; returns the number of indexed products."""
+    ProductSearchTerm.objects.all().delete()
+
+    total = 0
+    entries = []
+    products = Product.objects.prefetch_related("features").order_by("pk")
+    for product in products.iterator(chunk_size=batch_size):
+        entries.extend(build_entries(product, product.features.all()))
+        total += 1
+        if len(entries) >= batch_size:
+            ProductSearchTerm.objects.bulk_create(entries, batch_size=batch_size)
+            entries = []
+    if entries:
+        ProductSearchTerm.objects.bulk_create(entries, batch_size=batch_size)
+    return total
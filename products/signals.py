@@ -0,0 +1,88 @@
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from categories.models import Category
+from core.models import Banner
+from . import facets, home
+from .comments import refresh_comment_stats
+from .models import Product, ProductFeature, Capacity, Comment, Discount, discounted_price_expression
+from .search import index_product, indexing_deferred
+
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, raw=False, **kwargs):
+    # ردیف‌های ایندکس با CASCADE همراه محصول حذف می‌شوند
+    if raw or indexing_deferred():
+        return
+    index_product(instance)
+
+
+@receiver(post_save, sender=ProductFeature)
+@receiver(post_delete, sender=ProductFeature)
+def reindex_feature_product(sender, instance, raw=False, origin=None, **kwargs):
+    # حذف محصول (تکی یا queryset) ویژگی‌ها را CASCADE می‌کند؛ ایندکس هم همراهش حذف می‌شود
+    deleting_product = isinstance(origin, Product) or getattr(origin, "model", None) is Product
+    if raw or deleting_product or indexing_deferred():
+        return
+    product = Product.objects.filter(pk=instance.product_id).first()
+    if product is not None:
+        index_product(product)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def update_comment_stats(sender, instance, created=False, raw=False, **kwargs):
+    # دیدگاه تازه تا تایید نشود در شمارش‌ها اثری ندارد
+    if raw or (created and instance.status != Comment.STATUS.approved):
+        return
+    refresh_comment_stats(instance.product_id)
+
+
+@receiver(post_save, sender=Discount)
+def refresh_sale_prices(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    price = discounted_price_expression(instance.value)
+    Product.objects.filter(discount=instance).update(sale_price=price)
+    Capacity.objects.filter(discount=instance).update(sale_price=price)
+
+
+@receiver(pre_delete, sender=Discount)
+def reset_sale_prices(sender, instance, **kwargs):
+    # SET_NULL بدون save انجام می‌شود، پس قیمت نهایی را همین‌جا برمی‌گردانیم
+    Product.objects.filter(discount=instance).update(sale_price=F('price'))
+    Capacity.objects.filter(discount=instance).update(sale_price=F('price'))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_facets(sender, **kwargs):
+    facets.bump_version()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+@receiver(post_save, sender=Capacity)
+@receiver(post_delete, sender=Capacity)
+def invalidate_home_products(sender, **kwargs):
+    # ETag سبد کوچک هم به همین نسخه وابسته است؛ قیمت ظرفیت‌ها هم در آن دیده می‌شود
+    home.bump_version("products")
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_home_categories(sender, **kwargs):
+    home.bump_version("categories")
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_home_banners(sender, **kwargs):
+    home.bump_version("banners")
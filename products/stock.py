@@ -0,0 +1,114 @@
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from core.caching import cached_value
+from .models import Stock
+
+SNAPSHOT_KEY = "stock_availability"
+# نمایش موجودی کمی عقب باشد اشکالی ندارد؛ رزرو همیشه روی خود ردیف‌ها انجام می‌شود
+SNAPSHOT_TIMEOUT = 30
+
+
+class OutOfStock(Exception):
+    def __init__(self, keys):
+        super().__init__(keys)
+        # (product_id, capacity_id) هایی که موجودی کافی نداشتند
+        self.keys = keys
+
+
+def _per_row(quantities):
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def tracked_rows(keys):
+    """
+    ``{(product_id, capacity_id): Stock}`` for the tracked ones among ``keys``.
+    A capacity without its own row falls back to the product-level row.
+    """
+    rows = {
+        (row.product_id, row.capacity_id): row
+        for row in Stock.objects.filter(product_id__in={product_id for product_id, _ in keys})
+    }
+    tracked = {}
+    for product_id, capacity_id in keys:
+        row = rows.get((product_id, capacity_id)) or rows.get((product_id, None))
+        if row is not None:
+            tracked[(product_id, capacity_id)] = row
+    return tracked
+
+
+def reserve(quantities):
+    """
+    Reserve ``{(product_id, capacity_id): quantity}`` with a single
+    conditional UPDATE (``reserved + n <= on_hand`` per row). Untracked keys
+    are ignored. Returns ``{stock_id: quantity}``; raises ``OutOfStock`` when
+    any row is short, so the caller's transaction must roll back.
+    """
+    rows = tracked_rows(quantities)
+    if not rows:
+        return {}
+    reserved = {}
+    for key, row in rows.items():
+        reserved[row.pk] = reserved.get(row.pk, 0) + quantities[key]
+    delta = _per_row(reserved)
+    updated = (
+        Stock.objects
+        .filter(pk__in=reserved)
+        .filter(Q(on_hand__gte=F("reserved") + delta))
+        .update(reserved=F("reserved") + delta)
+    )
+    if updated != len(reserved):
+        short = Stock.objects.filter(pk__in=reserved, on_hand__lt=F("reserved") + delta)
+        raise OutOfStock([(row.product_id, row.capacity_id) for row in short])
+    return reserved
+
+
+def release(reserved):
+    """Give ``{stock_id: quantity}`` back to the available stock."""
+    if reserved:
+        delta = _per_row(reserved)
+        Stock.objects.filter(pk__in=reserved).update(reserved=F("reserved") - delta)
+
+
+def commit(reserved):
+    """A paid order: the reserved units leave the warehouse."""
+    if reserved:
+        delta = _per_row(reserved)
+        Stock.objects.filter(pk__in=reserved).update(
+            on_hand=F("on_hand") - delta,
+            reserved=F("reserved") - delta,
+        )
+
+
+def _snapshot():
+    snapshot = {}
+    for product_id, capacity_id, on_hand, reserved in Stock.objects.values_list(
+        "product_id", "capacity_id", "on_hand", "reserved"
+    ):
+        snapshot.setdefault(product_id, {})[capacity_id or 0] = on_hand - reserved
+    return snapshot
+
+
+def availability():
+    """Cached ``{product_id: {capacity_id or 0: available}}`` of tracked products."""
+    return cached_value(SNAPSHOT_KEY, _snapshot, SNAPSHOT_TIMEOUT)
+
+
+def capacity_available(lines, capacity_id):
+    """
+    Whether ``capacity_id`` can be sold, for a product's ``lines`` from
+    ``availability()``: its own row, else the product-level row, the same
+    row ``reserve`` would use. No row means untracked.
+    """
+    if lines is None:
+        return True
+    if capacity_id in lines:
+        return lines[capacity_id] > 0
+    return lines.get(0, 1) > 0
+
+
+def sold_out_ids():
+    return [product_id for product_id, lines in availability().items() if not any(lines.values())]
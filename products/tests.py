@@ -1,7 +1,26 @@
-from django.test import TestCase
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import NotSupportedError, connection
+from django.forms import modelform_factory
+from django.test.utils import CaptureQueriesContext
+from django.test import RequestFactory, TestCase
 from django.urls import reverse
 from django.utils import timezone
-from products.models import Product, Discount, Capacity, ProductFeature, Comment
+from products.models import Product, Discount, Capacity, ProductFeature, ProductImages, Comment, ProductSearchTerm, Stock
+from products.catalog import upsert_options
+from products.facets import get_facets
+from products.home import _banners, bump_version, get_home_snapshot, group_banners
+from core.caching import LOCAL_VERSION_TIMEOUT
+from core.models import Banner
+from products.search import normalize, search_products
+from products import stock
+from products.views import ProductListView
 from categories.models import Category
 from django.contrib.auth import get_user_model
 
@@ -53,6 +72,50 @@ class TestProductModels(TestCase):
         self.assertEqual(url, reverse("product-detail", kwargs={"slug": "test-product"}))
 
 
+class TestSalePrice(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Cat1", slug="cat1")
+        self.discount = Discount.objects.create(value=15)
+        self.products = [
+            Product.objects.create(
+                title=f"P{price}",
+                slug=f"p{price}",
+                price=price,
+                discount=self.discount if price % 2 else None,
+                category=self.category,
+                image="x.jpg",
+                description="desc",
+            )
+            for price in (0, 1, 99, 105, 1999, 123457)
+        ]
+        self.capacity = Capacity.objects.create(capacity="1TB", platform="PS5", price=99999, discount=self.discount)
+
+    def assertInSync(self):
+        for product in Product.objects.select_related("discount"):
+            self.assertEqual(product.sale_price, product.get_final_price())
+        for capacity in Capacity.objects.select_related("discount"):
+            self.assertEqual(capacity.sale_price, capacity.final_price())
+
+    def test_sale_price_on_save(self):
+        self.assertInSync()
+
+    def test_discount_value_change(self):
+        for value in (0, 33, 99, 100, 150):
+            self.discount.value = value
+            self.discount.save()
+            self.assertInSync()
+
+    def test_discount_delete(self):
+        self.discount.delete()
+        self.assertInSync()
+
+    def test_backfill_command(self):
+        Product.objects.update(sale_price=0)
+        Capacity.objects.update(sale_price=0)
+        call_command("backfill_sale_prices", stdout=StringIO())
+        self.assertInSync()
+
+
 class TestProductListView(TestCase):
     def setUp(self):
         self.category = Category.objects.create(name="Cat1", slug="cat1")
@@ -94,6 +157,11 @@ class TestProductListView(TestCase):
         self.assertIn(self.product1, response.context["object_list"])
         self.assertNotIn(self.product2, response.context["object_list"])
 
+    def test_filter_by_discounted_price(self):
+        # 100 با ۱۰٪ تخفیف → 90
+        response = self.get("?min_price=95&max_price=200")
+        self.assertNotIn(self.product1, response.context["object_list"])
+
     def test_sort_cheapest(self):
         response = self.get("?sort_query=cheapest")
         products = list(response.context["object_list"])
@@ -110,6 +178,275 @@ class TestProductListView(TestCase):
         self.assertNotIn(self.product2, response.context["object_list"])
 
 
+class TestProductSearch(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Cat1", slug="cat1")
+        self.title_match = Product.objects.create(
+            title="اکانت قانونی فیفا ۲۵",
+            slug="fifa",
+            price=100,
+            category=self.category,
+            image="x.jpg",
+            description="بازی فوتبال",
+        )
+        self.description_match = Product.objects.create(
+            title="گیفت کارت",
+            slug="gift",
+            price=100,
+            category=self.category,
+            image="x.jpg",
+            description="مناسب برای خرید فیفا",
+        )
+
+    def search(self, query):
+        return list(search_products(Product.objects.all(), query).order_by("-search_rank"))
+
+    def test_normalize(self):
+        self.assertEqual(normalize("كارت يك"), "کارت یک")
+        self.assertEqual(normalize("می\u200cخواهم"), "میخواهم")
+        self.assertEqual(normalize("۲۵ ٣"), "25 3")
+
+    def test_arabic_letters_and_digits_match(self):
+        self.assertEqual(self.search("فيفا 25"), [self.title_match])
+        self.assertIn(self.description_match, self.search("كارت"))
+
+    def test_title_ranks_above_description(self):
+        self.assertEqual(self.search("فیفا"), [self.title_match, self.description_match])
+
+    def test_prefix_match_on_last_term(self):
+        self.assertEqual(self.search("گیف"), [self.description_match])
+
+    def test_query_without_words(self):
+        self.assertEqual(self.search("!!"), [])
+        for query in ("!!", "-", " "):
+            response = self.client.get(reverse("products"), {"q": query})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.context["object_list"]), [])
+
+    def test_accented_terms_are_distinct(self):
+        self.title_match.title = "pokémon pokemon"
+        self.title_match.save()
+        self.assertEqual(
+            # روی MySQL به collation دودویی ستون term وابسته است
+            sorted(self.title_match.search_terms.filter(term__startswith="pok").values_list("term", flat=True)),
+            ["pokemon", "pokémon"],
+        )
+
+    def test_index_follows_features_and_deletes(self):
+        feature = ProductFeature.objects.create(product=self.description_match, key="پلتفرم", value="PS5")
+        self.assertEqual(self.search("ps5"), [self.description_match])
+
+        feature.delete()
+        self.assertEqual(self.search("ps5"), [])
+
+        self.title_match.delete()
+        self.assertFalse(ProductSearchTerm.objects.filter(product_id=self.title_match.pk).exists())
+
+
+class TestProductCursorPagination(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Cat1", slug="cat1")
+        Product.objects.bulk_create([
+            Product(
+                title=f"P{i}",
+                slug=f"p{i}",
+                price=i % 7,
+                sale_price=i % 7,
+                category=self.category,
+                image="x.jpg",
+                description="desc",
+            )
+            for i in range(65)
+        ])
+
+    def walk(self, query):
+        ids, pages = [], []
+        response = self.client.get(reverse("products") + query)
+        while True:
+            page = response.context["page_obj"]
+            pages.append(page)
+            ids += [product.id for product in page]
+            if not page.has_next():
+                return ids, pages
+            response = self.client.get(reverse("products"), {"sort_query": "cheapest", "cursor": page.next_cursor})
+
+    def test_walk_matches_offset_order(self):
+        ids, pages = self.walk("?sort_query=cheapest&cursor=")
+        expected = list(Product.objects.order_by("sale_price", "id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual([len(page) for page in pages], [30, 30, 5])
+        self.assertEqual(pages[0].paginator.count, 65)
+
+    def test_previous_cursor(self):
+        _, pages = self.walk("?sort_query=cheapest&cursor=")
+        response = self.client.get(reverse("products"), {"sort_query": "cheapest", "cursor": pages[2].previous_cursor})
+        self.assertEqual(list(response.context["page_obj"]), list(pages[1]))
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        first = self.client.get(reverse("products") + "?cursor=").context["page_obj"]
+        response = self.client.get(reverse("products"), {"cursor": first.next_cursor[:-2] + "xx"})
+        self.assertEqual(list(response.context["page_obj"]), list(first))
+
+    def test_deep_page_skips_count_and_offset(self):
+        _, pages = self.walk("?sort_query=cheapest&cursor=")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("products"), {"sort_query": "cheapest", "cursor": pages[1].next_cursor})
+        self.assertEqual(len(response.context["page_obj"]), 5)
+        sql = " ".join(query["sql"] for query in queries).upper()
+        self.assertNotIn("COUNT(", sql)
+        self.assertNotIn("OFFSET", sql)
+
+
+class TestProductFacets(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.games = Category.objects.create(name="Games", slug="games")
+        self.cards = Category.objects.create(name="Cards", slug="cards")
+        discount = Discount.objects.create(value=10)
+        for i, (category, type_, price, discounted) in enumerate([
+            (self.games, Product.Type.ACCOUNT, 100_000, True),
+            (self.games, Product.Type.ACCOUNT, 2_000_000, False),
+            (self.games, Product.Type.PHYSICAL, 4_000_000, True),
+            (self.cards, Product.Type.GIFT_CARD, 600_000, False),
+        ]):
+            Product.objects.create(
+                title=f"P{i}",
+                slug=f"p{i}",
+                price=price,
+                type=type_,
+                discount=discount if discounted else None,
+                category=category,
+                image="x.jpg",
+                description="desc",
+            )
+
+    def facets(self, query=""):
+        return self.client.get(reverse("products") + query).context["facets"]
+
+    def test_counts(self):
+        facets = self.facets()
+        self.assertEqual({c["slug"]: c["count"] for c in facets["categories"]}, {"games": 3, "cards": 1})
+        self.assertEqual({t["value"]: t["count"] for t in facets["types"]}, {"A": 2, "P": 1, "C": 1})
+        self.assertEqual([b["count"] for b in facets["prices"]], [1, 1, 1, 1])
+        self.assertEqual(facets["special"], 2)
+
+    def test_price_links_match_bucket_counts(self):
+        Product.objects.create(
+            title="Edge", slug="edge", price=500_000, category=self.cards, image="x.jpg", description="desc",
+        )
+        for bucket in self.facets()["prices"]:
+            query = {"min_price": bucket["min"]}
+            if bucket["max"] is not None:
+                query["max_price"] = bucket["max"]
+            response = self.client.get(reverse("products"), query)
+            self.assertEqual(len(response.context["object_list"]), bucket["count"], bucket["label"])
+
+    def test_selected_facet_keeps_its_own_options(self):
+        facets = self.facets("?category_slug=games")
+        self.assertEqual({c["slug"]: c["count"] for c in facets["categories"]}, {"games": 3, "cards": 1})
+        self.assertEqual({t["value"]: t["count"] for t in facets["types"]}, {"A": 2, "P": 1})
+        self.assertEqual(facets["special"], 2)
+
+    def test_single_query_then_cached(self):
+        view = ProductListView()
+        view.request = RequestFactory().get(reverse("products"), {"type": "A"})
+        view.get_queryset()
+        with self.assertNumQueries(1):
+            get_facets(view.facet_queryset, view.selected_facets, view.filter_signature)
+        with self.assertNumQueries(0):
+            get_facets(view.facet_queryset, view.selected_facets, view.filter_signature)
+
+    def test_product_change_invalidates(self):
+        self.facets()
+        Product.objects.filter(slug="p3").first().delete()
+        self.assertEqual(self.facets()["categories"], [{"slug": "games", "name": "Games", "count": 3}])
+
+
+class TestCatalogImportExport(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Cat1", slug="cat1")
+        discount = Discount.objects.create(value=10)
+        self.product = Product.objects.create(
+            title="اکانت فیفا", slug="fifa", price=200000, discount=discount,
+            category=self.category, image="products/a.jpg", description="desc",
+        )
+        self.product.capacity.add(Capacity.objects.create(capacity="ظرفیت ۱", platform="PS5", price=100000))
+        ProductFeature.objects.create(product=self.product, key="ریجن", value="آسیا")
+        ProductImages.objects.create(product=self.product, image="products/b.jpg")
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(lambda: [os.remove(os.path.join(self.dir, f)) for f in os.listdir(self.dir)])
+
+    def roundtrip(self, extension):
+        path = os.path.join(self.dir, f"catalog.{extension}")
+        call_command("catalog_export", path, stdout=StringIO())
+        Product.objects.all().delete()
+        Capacity.objects.all().delete()
+        call_command("catalog_import", path, stdout=StringIO())
+
+        product = Product.objects.get(slug="fifa")
+        self.assertEqual(product.sale_price, 180000)
+        self.assertEqual(product.discount.value, 10)
+        self.assertEqual([c.platform for c in product.capacity.all()], ["PS5"])
+        self.assertEqual([(f.key, f.value) for f in product.features.all()], [("ریجن", "آسیا")])
+        self.assertEqual([i.image.name for i in product.images.all()], ["products/b.jpg"])
+        self.assertTrue(search_products(Product.objects.all(), "آسیا").filter(pk=product.pk).exists())
+
+    def test_csv_roundtrip(self):
+        self.roundtrip("csv")
+
+    def test_jsonl_roundtrip(self):
+        self.roundtrip("jsonl")
+
+    def write(self, lines):
+        path = os.path.join(self.dir, "import.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        return path
+
+    def test_upsert_by_slug(self):
+        path = self.write([
+            '{"slug": "fifa", "title": "جدید", "category": "cat1", "price": 5000, "features": [{"key": "k", "value": "v"}]}',
+            '{"slug": "gta", "title": "GTA", "category": "cat1", "price": 7000}',
+            '{"slug": "bad", "title": "x", "category": "missing", "price": 1}',
+        ])
+        err = StringIO()
+        call_command("catalog_import", path, "--batch-size", "1", stdout=StringIO(), stderr=err)
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.title, self.product.sale_price, self.product.discount), ("جدید", 5000, None))
+        self.assertEqual(list(self.product.features.values_list("key", flat=True)), ["k"])
+        self.assertFalse(self.product.images.exists())
+        self.assertTrue(Product.objects.filter(slug="gta", sale_price=7000).exists())
+        self.assertIn("row 3", err.getvalue())
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_upsert_options_per_backend(self):
+        def check_options(update_fields, unique_fields):
+            fields = lambda names: [Product._meta.get_field(name) for name in names or []]
+            Product.objects.all()._check_bulk_create_options(False, True, fields(update_fields), fields(unique_fields))
+
+        for with_target in (True, False):
+            with self.subTest(with_target=with_target), \
+                    mock.patch.object(connection.features, "supports_update_conflicts_with_target", with_target):
+                options = upsert_options()
+                self.assertEqual("unique_fields" in options, with_target)
+                # همان بررسی‌ای که bulk_create پیش از ساختن SQL انجام می‌دهد
+                check_options(options["update_fields"], options.get("unique_fields"))
+        with mock.patch.object(connection.features, "supports_update_conflicts_with_target", False), \
+                self.assertRaises(NotSupportedError):
+            check_options(["title"], ["slug"])
+
+    def test_dry_run_rolls_back(self):
+        path = self.write(['{"slug": "gta", "title": "GTA", "category": "cat1", "price": 7000, "discount": 50}'])
+        out = StringIO()
+        call_command("catalog_import", path, "--dry-run", stdout=out)
+        self.assertIn("1 created", out.getvalue())
+        self.assertFalse(Product.objects.filter(slug="gta").exists())
+        self.assertFalse(Discount.objects.filter(value=50).exists())
+
+
 class TestProductDetailView(TestCase):
     def setUp(self):
         self.category = Category.objects.create(name="Cat1", slug="cat1")
@@ -129,9 +466,154 @@ class TestProductDetailView(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context["product"], self.product)
 
+    def test_sold_out_product_cannot_be_added(self):
+        Stock.objects.create(product=self.product, on_hand=0)
+        cache.delete(stock.SNAPSHOT_KEY)
+        response = self.client.get(reverse("product-detail", kwargs={"slug": "test-product"}))
+        self.assertFalse(response.context["product"].available)
+        self.assertContains(response, "ناموجود")
+
+
+class TestStock(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Cat1", slug="cat1")
+        self.product = Product.objects.create(
+            title="Test Product", slug="test-product", price=100, category=category, image="x.jpg",
+        )
+        self.capacity = Capacity.objects.create(capacity="1TB", platform="PS5", price=100)
+        self.stock = Stock.objects.create(product=self.product, capacity=self.capacity, on_hand=5)
+        cache.delete(stock.SNAPSHOT_KEY)
+
+    def test_reserve_release_commit(self):
+        reserved = stock.reserve({(self.product.pk, self.capacity.pk): 2})
+        self.assertEqual(reserved, {self.stock.pk: 2})
+        stock.release({self.stock.pk: 1})
+        stock.commit({self.stock.pk: 1})
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.on_hand, self.stock.reserved), (4, 0))
+
+    def test_reserve_single_statement(self):
+        keys = {(self.product.pk, self.capacity.pk): 1, (self.product.pk, None): 1}
+        with self.assertNumQueries(2):
+            self.assertEqual(stock.reserve(keys), {self.stock.pk: 1})
+
+    def test_reserve_short(self):
+        with self.assertRaises(stock.OutOfStock) as raised:
+            stock.reserve({(self.product.pk, self.capacity.pk): 6})
+        self.assertEqual(raised.exception.keys, [(self.product.pk, self.capacity.pk)])
+
+    def test_on_hand_below_reserved_is_invalid(self):
+        stock.reserve({(self.product.pk, self.capacity.pk): 3})
+        self.stock.refresh_from_db()
+        self.stock.on_hand = 2
+        with self.assertRaises(ValidationError):
+            self.stock.full_clean()
+
+    def test_product_level_row_covers_capacities(self):
+        other = Capacity.objects.create(capacity="2TB", platform="PS5", price=100)
+        self.product.capacity.add(self.capacity, other)
+        product_row = Stock.objects.create(product=self.product, on_hand=2)
+        Stock.objects.filter(pk=self.stock.pk).update(on_hand=0)
+        cache.delete(stock.SNAPSHOT_KEY)
+
+        response = self.client.get(reverse("product-detail", kwargs={"slug": self.product.slug}))
+        available = {capacity.pk: capacity.available for capacity in response.context["product"].capacity.all()}
+        self.assertEqual(available, {self.capacity.pk: False, other.pk: True})
+        self.assertTrue(response.context["product"].available)
+
+        self.assertEqual(stock.reserve({(self.product.pk, other.pk): 1, (self.product.pk, None): 1}), {product_row.pk: 2})
+        with self.assertRaises(stock.OutOfStock):
+            stock.reserve({(self.product.pk, other.pk): 1})
+
+    def test_availability_and_sold_out(self):
+        self.assertEqual(stock.availability(), {self.product.pk: {self.capacity.pk: 5}})
+        self.assertEqual(stock.sold_out_ids(), [])
+        Stock.objects.filter(pk=self.stock.pk).update(on_hand=0)
+        cache.delete(stock.SNAPSHOT_KEY)
+        self.assertEqual(stock.sold_out_ids(), [self.product.pk])
+        response = self.client.get(reverse("products"), {"available": "1"})
+        self.assertNotIn(self.product, response.context["object_list"])
+
+
+class TestCommentAggregates(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(phone="09120000000", password="pass")
+        self.category = Category.objects.create(name="Cat1", slug="cat1")
+        self.product = Product.objects.create(
+            title="Test Product", slug="test-product", price=100,
+            category=self.category, image="x.jpg", description="demo",
+        )
+
+    def add_comments(self, count, status=Comment.STATUS.approved, recommend=True):
+        return [
+            Comment.objects.create(
+                product=self.product, user=self.user, name=f"n{i}",
+                content="c", recommend=recommend, status=status,
+            )
+            for i in range(count)
+        ]
+
+    def test_counts_follow_status_changes(self):
+        draft, = self.add_comments(1, status=Comment.STATUS.draft)
+        self.add_comments(1, recommend=False)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.approved_comments, self.product.recommend_percent), (1, 0))
+
+        draft.status = Comment.STATUS.approved
+        draft.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.approved_comments, self.product.recommend_percent), (2, 50))
+
+        draft.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.approved_comments, 1)
+
+    def test_product_save_keeps_counters(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.add_comments(2)
+        Product.objects.filter(pk=self.product.pk).update(total_sell=3)
+        stale.title = "renamed"
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.title, self.product.approved_comments, self.product.total_sell), ("renamed", 2, 3))
+
+    def test_counters_are_not_editable(self):
+        form = modelform_factory(Product, fields="__all__")
+        self.assertFalse(set(Product.COUNTER_FIELDS) & set(form.base_fields))
+
+    def detail_queries(self):
+        url = reverse("product-detail", kwargs={"slug": "test-product"})
+        self.client.get(url)  # گرم کردن cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return len(queries), response
+
+    def test_detail_queries_constant(self):
+        self.add_comments(1)
+        few, _ = self.detail_queries()
+        self.add_comments(40)
+        many, response = self.detail_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context["comments"]), 10)
+        self.assertEqual(response.context["next_comments_page"], 2)
+
+    def test_comment_fragment(self):
+        self.add_comments(15)
+        url = reverse("product-comments", kwargs={"slug": "test-product"})
+        response = self.client.get(url, {"page": 2})
+        self.assertEqual(len(response.context["comments"]), 5)
+        self.assertIsNone(response.context["next_comments_page"])
+        self.assertNotContains(response, "<html")
+        self.assertNotContains(response, "data-comments-more")
+
+        response = self.client.get(url, {"page": 1, "layout": "mobile"})
+        self.assertContains(response, "page=2&amp;layout=mobile")
+
 
 class TestHomeView(TestCase):
     def setUp(self):
+        cache.clear()
         self.category = Category.objects.create(name="Cat1", slug="cat1", image="x.jpg")
         Product.objects.create(
             title="P1",
@@ -148,10 +630,69 @@ class TestHomeView(TestCase):
         self.assertIn("newest_products", response.context)
         self.assertIn("categories", response.context)
 
+    def test_snapshot_single_round_trip_when_warm(self):
+        get_home_snapshot()
+        with self.assertNumQueries(0), \
+                mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many, \
+                mock.patch.object(cache, "set_many", wraps=cache.set_many) as set_many:
+            context = get_home_snapshot()
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(set_many.call_count, 0)
+        self.assertEqual([p.title for p in context["newest_products"]], ["P1"])
+
+    def test_edit_shows_immediately(self):
+        get_home_snapshot()
+        product = Product.objects.get(slug="p1")
+        product.title = "P1 edited"
+        product.save()
+        with self.assertNumQueries(4):
+            # فقط بخش محصولات دوباره ساخته می‌شود
+            context = get_home_snapshot()
+        self.assertEqual([p.title for p in context["newest_products"]], ["P1 edited"])
+
+    def test_short_timeout_on_process_local_cache(self):
+        with mock.patch.object(cache, "set_many", wraps=cache.set_many) as set_many:
+            get_home_snapshot()
+            bump_version("products")
+        self.assertEqual({call.args[1] for call in set_many.call_args_list}, {LOCAL_VERSION_TIMEOUT})
+
+    def banner(self, placement, position=0, **kwargs):
+        return Banner.objects.create(placement=placement, image="b.jpg", link="https://example.com", position=position, **kwargs)
+
+    def test_banners_grouped_from_one_query(self):
+        for position in (3, 1, 2):
+            self.banner(Banner.Placement.SLIDER, position)
+        side = self.banner(Banner.Placement.SIDE)
+        self.banner(Banner.Placement.MIDDLE, is_active=False)
+        with self.assertNumQueries(1):
+            banners = _banners()["banners"]
+        context = group_banners(banners)
+        self.assertEqual([b.position for b in context["slider_banners"]], [1, 2, 3])
+        self.assertEqual(context["side_banners"], [side])
+        self.assertEqual(context["middle_banners"], [])
+
+    def test_banner_schedule_and_limits(self):
+        now = timezone.now()
+        for position in range(7):
+            self.banner(Banner.Placement.SLIDER, position)
+        later = self.banner(Banner.Placement.SIDE, starts_at=now + timezone.timedelta(hours=1))
+        self.banner(Banner.Placement.SIDE, ends_at=now - timezone.timedelta(hours=1))
+        banners = _banners()["banners"]
+        self.assertEqual(len(group_banners(banners, now)["slider_banners"]), 5)
+        self.assertEqual(group_banners(banners, now)["side_banners"], [])
+        # بنر زمان‌بندی‌شده بدون ساخت دوباره‌ی snapshot نمایش داده می‌شود
+        self.assertEqual(group_banners(banners, now + timezone.timedelta(hours=2))["side_banners"], [later])
+
+    def test_banner_edit_refreshes_home(self):
+        get_home_snapshot()
+        banner = self.banner(Banner.Placement.MIDDLE)
+        self.assertEqual(get_home_snapshot()["middle_banners"], [banner])
+
 
 class TestCommentAdd(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(phone="09120000000", password="1234")
 
         self.category = Category.objects.create(name="Cat1", slug="cat1", image="x.jpg")
@@ -164,6 +705,16 @@ class TestCommentAdd(TestCase):
             description="test",
         )
 
+    def test_comment_add_rate_limited(self):
+        self.client.login(phone="09120000000", password="1234")
+        url = reverse("comment-add", kwargs={"slug": "p1"})
+        for _ in range(5):
+            self.client.post(url, {"name": "Test", "recommend": True, "content": "Good!"})
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {"name": "Test", "recommend": True, "content": "Good!"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(Comment.objects.count(), 5)
+
     def test_add_comment_logged_in(self):
         self.client.login(phone="09120000000", password="1234")
 
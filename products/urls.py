@@ -6,5 +6,6 @@ urlpatterns = [
     path("", views.home_view, name="home"),
     path("products/", views.ProductListView.as_view(), name="products"),
     path("products/<str:slug>/", views.ProductDetailView.as_view(), name="product-detail"),
+    path("products/<str:slug>/comments/", views.comment_list, name="product-comments"),
     path("comment/add/<str:slug>", views.comment_add, name="comment-add"),
 ]
\ No newline at end of file
@@ -1,87 +1,25 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
+from django.utils.functional import cached_property
 from django.views import generic
 from django.contrib import messages
 
+from .comments import approved_comments_page
 from .forms import CommentForm
-from .models import Product, Comment, Discount
-from core.models import SliderBanners, SideBanners, MiddleBanners
-from categories.models import Category
-from django.db.models import Q
+from .models import Product
+from .facets import get_facets
+from .home import get_home_snapshot
+from .ranking import best_sellers
+from .pagination import CursorPaginator, SORT_ORDERINGS, DEFAULT_ORDERING, filter_signature
+from .search import search_products, RELEVANCE_ORDERING
+from .stock import availability, capacity_available, sold_out_ids
 from django.core.cache import cache
+from core.ratelimit import rate_limit
 
 
 def home_view(request):
-
-    # ======== محصولات جدید ========
-    newest_products = cache.get("home_newest_products")
-    if newest_products is None:
-        newest_products = list(
-            Product.objects.newest().select_related("discount")[:15]
-        )
-        cache.set("home_newest_products", newest_products, 300)
-
-    # ======== محصولات تخفیف دار ========
-    discounted_products = cache.get("home_discounted_products")
-    if discounted_products is None:
-        discounted_products = list(
-            Product.objects.discounted().select_related("discount")[:15]
-        )
-        cache.set("home_discounted_products", discounted_products, 300)
-
-    # ======== محصولات فیزیکی ========
-    physical_products = cache.get("home_physical_products")
-    if physical_products is None:
-        physical_products = list(
-            Product.objects.filter(type=Product.Type.PHYSICAL)
-            .select_related("discount")[:15]
-        )
-        cache.set("home_physical_products", physical_products, 300)
-
-    # ======== گیفت کارت ها ========
-    gift_cards = cache.get("home_gift_cards")
-    if gift_cards is None:
-        gift_cards = list(
-            Product.objects.filter(type=Product.Type.GIFT_CARD)
-            .select_related("discount")[:15]
-        )
-        cache.set("home_gift_cards", gift_cards, 300)
-
-    # ======== اسلایدر ========
-    slider_banners = cache.get("home_slider_banners")
-    if slider_banners is None:
-        slider_banners = list(SliderBanners.objects.all()[:5])
-        cache.set("home_slider_banners", slider_banners, 3600)
-
-    # ======== بنرهای کنار ========
-    side_banners = cache.get("home_side_banners")
-    if side_banners is None:
-        side_banners = list(SideBanners.objects.all()[:2])
-        cache.set("home_side_banners", side_banners, 3600)
-
-    # ======== بنرهای وسط ========
-    middle_banners = cache.get("home_middle_banners")
-    if middle_banners is None:
-        middle_banners = list(MiddleBanners.objects.all()[:2])
-        cache.set("home_middle_banners", middle_banners, 3600)
-
-    # ======== دسته‌بندی‌ها ========
-    categories = cache.get("home_categories")
-    if categories is None:
-        categories = list(Category.objects.all()[:6])
-        cache.set("home_categories", categories, 600)
-
-    # ======== خروجی ========
-    return render(request, 'products/home.html', {
-        'newest_products': newest_products,
-        'discounted_products': discounted_products,
-        'physical_products': physical_products,
-        'gift_cards': gift_cards,
-        'slider_banners': slider_banners,
-        'side_banners': side_banners,
-        'middle_banners': middle_banners,
-        'categories': categories,
-    })
+    return render(request, 'products/home.html', get_home_snapshot())
 
 class ProductListView(generic.ListView):
     model = Product
@@ -96,39 +34,65 @@ class ProductListView(generic.ListView):
             cache.set("active_products_base", base_qs, 300)
         queryset = base_qs
 
-        category_slug = self.request.GET.get('category_slug', None)
-        if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
         min_price = self.request.GET.get('min_price', None)
+        if min_price:
+            queryset = queryset.filter(sale_price__gte=min_price)
         max_price = self.request.GET.get('max_price', None)
-        if min_price and max_price:
-            queryset = queryset.filter(price__gte=min_price, price__lte=max_price)
+        if max_price:
+            queryset = queryset.filter(sale_price__lte=max_price)
         available = self.request.GET.get('available', None)
         if available:
-            queryset = queryset.filter(status=Product.STATUS.available)
-        special = self.request.GET.get('special', None)
-        if special:
-            queryset = queryset.filter(discount__isnull=False)
+            queryset = queryset.filter(status=Product.STATUS.available).exclude(pk__in=sold_out_ids())
 
         sort_query = self.request.GET.get('sort_query', None)
-        sort_query_map = {
-            'newest': lambda: Product.objects.newest(),
-            'best-sell': lambda: Product.objects.active().order_by('total_sell'),
-            'most-expensive': lambda: Product.objects.most_expensive(),
-            'cheapest': lambda: Product.objects.cheapest(),
-            'discounted': lambda: Product.objects.discounted(),
-        }
-        if sort_query in sort_query_map:
-            queryset = sort_query_map[sort_query]()
+        self.ordering = SORT_ORDERINGS.get(sort_query, DEFAULT_ORDERING)
+
         search = self.request.GET.get('q', None)
         if search:
-            queryset = queryset.filter(Q(title__icontains=search) | Q(description__icontains=search))
-        return queryset
+            queryset = search_products(queryset, search)
+            if sort_query not in SORT_ORDERINGS:
+                self.ordering = RELEVANCE_ORDERING
+
+        # فیلترهای facet جدا اعمال می‌شوند تا شمارش‌ها از همین queryset پایه گرفته شوند
+        self.facet_queryset = queryset
+        self.selected_facets = {
+            'category': self.request.GET.get('category_slug', None),
+            'type': self.request.GET.get('type', None),
+            'special': bool(self.request.GET.get('special', None)) or sort_query == 'discounted',
+        }
+        if self.selected_facets['category']:
+            queryset = queryset.filter(category__slug=self.selected_facets['category'])
+        if self.selected_facets['type']:
+            queryset = queryset.filter(type=self.selected_facets['type'])
+        if self.selected_facets['special']:
+            queryset = queryset.filter(discount__isnull=False)
+        return queryset.select_related('discount').order_by(*self.ordering)
+
+    @cached_property
+    def filter_signature(self):
+        return filter_signature({
+            key: value for key, value in self.request.GET.items()
+            if key not in ('cursor', 'page')
+        })
+
+    @property
+    def cursor_pagination(self):
+        return 'cursor' in self.request.GET or settings.PRODUCTS_CURSOR_PAGINATION
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.cursor_pagination:
+            return super().paginate_queryset(queryset, page_size)
+
+        count_key = f"products_count:{self.filter_signature}"
+        paginator = CursorPaginator(queryset, page_size, self.ordering, count_key=count_key)
+        page = paginator.page(self.request.GET.get('cursor'))
+        return paginator, page, page.object_list, page.has_other_pages()
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super(ProductListView, self).get_context_data(**kwargs)
-        context['categories'] = Category.objects.filter(image__isnull=False)
         context["search_form"] = True
+        context["cursor_pagination"] = self.cursor_pagination
+        context["facets"] = get_facets(self.facet_queryset, self.selected_facets, self.filter_signature)
         return context
 
 
@@ -149,12 +113,44 @@ class ProductDetailView(generic.DetailView):
 
     def get_context_data(self, **kwargs):
         context = super(ProductDetailView, self).get_context_data(**kwargs)
-        context['related_products'] = Product.objects.filter(category=context['product'].category).exclude(slug=context['product'].slug)
-        context['comments'] = Comment.objects.filter(product=context['product'], status=Comment.STATUS.approved)
+        product = context['product']
+        # محصولی که ردیف Stock ندارد موجودی نامحدود دارد
+        stock = availability().get(product.pk)
+        capacities = product.capacity.all()
+        for capacity in capacities:
+            capacity.available = capacity_available(stock, capacity.pk)
+        if capacities:
+            product.available = any(capacity.available for capacity in capacities)
+        else:
+            product.available = stock is None or any(stock.values())
+        context['related_products'] = best_sellers(product.category_id, limit=10, exclude=product.pk)
+        context['comments'], context['next_comments_page'] = approved_comments_page(product.slug)
         context['comment_form'] = CommentForm()
         return context
 
 
+COMMENT_LAYOUTS = {
+    'desktop': 'products/_comment_items.html',
+    'mobile': 'products/_comment_cards.html',
+}
+
+
+def comment_list(request, slug):
+    """HTML fragment with the next page of approved comments (no base layout)."""
+    try:
+        page = max(int(request.GET.get('page', 2)), 1)
+    except ValueError:
+        page = 1
+    template_name = COMMENT_LAYOUTS.get(request.GET.get('layout'), COMMENT_LAYOUTS['desktop'])
+    comments, next_page = approved_comments_page(slug, page)
+    return render(request, template_name, {
+        'comments': comments,
+        'next_comments_page': next_page,
+        'product_slug': slug,
+    })
+
+
+@rate_limit("comment_add", session="5/10m", ip="20/10m")
 @login_required
 def comment_add(request, slug):
     product = get_object_or_404(Product, slug=slug)